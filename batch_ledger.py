@@ -0,0 +1,114 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+from in_parser import output_paths
+
+
+def file_hash(filepath):
+    """SHA-256 of the file contents, used as the job key."""
+    h = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class JobLedger:
+    """Append-only JSON-lines record of batch jobs keyed by input file and hash.
+
+    Every state change appends one line, so a crash can at worst lose the line
+    being written. On load the last record for each (input, key) wins. The
+    path is part of the key: identical models in other folders have outputs of
+    their own and are not complete just because one of them ran.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.traces = {}  # absolute input path -> n of its latest run
+        self.load()
+
+    def load(self):
+        self.jobs = {}
+        self.traces = {}
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Truncated last line from an interrupted write
+                    continue
+                self.jobs[(record["input"], record["key"])] = record
+                if record.get("n") is not None:
+                    self.traces[record["input"]] = record["n"]
+
+    def record(self, input_path, state, key=None, **fields):
+        """Appends a new state for input_path and returns the record."""
+        if key is None:
+            key = file_hash(input_path)
+        input_path = os.path.abspath(input_path)
+        with self.lock:
+            record = dict(self.jobs.get((input_path, key), {}))
+            record.update(fields)
+            record.update(key=key, input=input_path, state=state, time=time.time())
+            self.jobs[(input_path, key)] = record
+            if record.get("n") is not None:
+                self.traces[record["input"]] = record["n"]
+            with open(self.path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        return record
+
+    def start(self, input_path, n, key=None):
+        return self.record(input_path, "running", key=key, n=n, returncode=None,
+                           started=time.time(), wall_time=None)
+
+    def finish(self, input_path, returncode, key=None):
+        if key is None:
+            key = file_hash(input_path)
+        record = self.jobs.get((os.path.abspath(input_path), key), {})
+        started = record.get("started")
+        wall_time = time.time() - started if started else None
+        state = "done" if returncode == 0 else "failed"
+        outputs = output_paths(input_path, record.get("n", 1)) if returncode == 0 else []
+        return self.record(input_path, state, key=key, returncode=returncode,
+                           wall_time=wall_time, outputs=outputs)
+
+    def traces_for(self, input_path):
+        """-n the latest run of input_path used, or None if it was never run."""
+        return self.traces.get(os.path.abspath(input_path))
+
+    def is_complete(self, input_path, n=None, key=None):
+        """True if input_path already finished and all of its outputs still exist.
+
+        A group that has since been merged (and its trace files removed) also counts
+        as complete if the merged file is there.
+        """
+        if key is None:
+            key = file_hash(input_path)
+        record = self.jobs.get((os.path.abspath(input_path), key))
+        if not record or record.get("state") != "done":
+            return False
+        if n is not None and record.get("n") != n:
+            return False
+        # A cached run records the merged file it restored rather than trace files
+        outputs = record.get("outputs", []) if record.get("cached") else output_paths(input_path, record.get("n", 1))
+        if outputs and all(os.path.exists(p) for p in outputs):
+            return True
+        merged = merged_path(input_path, outputs)
+        return merged is not None and os.path.exists(merged)
+
+
+def merged_path(input_path, outputs):
+    """Name tools.outputfiles_merge gives the merged file of a run's outputs."""
+    if not outputs:
+        return None
+    stem = os.path.splitext(os.path.basename(input_path))[0]
+    return os.path.join(os.path.dirname(outputs[0]), f"{stem}_merged.out")
@@ -0,0 +1,156 @@
+"""Renders many merged B-scans without paying matplotlib start-up per file.
+
+Each worker process imports matplotlib once with the Agg backend, builds one
+figure/axes/colorbar and only swaps the image data, limits and labels for every
+file. The images match the ones plot_Bscan.mpl_plot saves.
+"""
+
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import h5py
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from tools.outputfiles_merge import get_output_data
+from sweep_manifest import SweepManifest, parse_criteria
+
+
+class BscanRenderer:
+    """One reusable figure for B-scan images."""
+
+    def __init__(self, figsize=(20, 10), dpi=300, cmap='grey'):
+        self.dpi = dpi
+        self.fig = Figure(figsize=figsize, facecolor='w', edgecolor='w')
+        FigureCanvasAgg(self.fig)
+        self.ax = self.fig.add_subplot(111)
+        self.im = self.ax.imshow(np.zeros((2, 2)), interpolation='nearest', aspect='auto', cmap=cmap)
+        self.ax.set_xlabel('Trace number')
+        self.ax.set_ylabel('Time [s]')
+        self.cb = self.fig.colorbar(self.im, ax=self.ax)
+
+    def render(self, filename, rxnumber, rxcomponent, save_dir):
+        """Draws one receiver component of filename and saves it as PNG."""
+        outputdata, dt = get_output_data(filename, rxnumber, rxcomponent)
+        vmax = np.amax(np.abs(outputdata))
+        tmax = outputdata.shape[0] * dt
+
+        self.im.set_data(outputdata)
+        self.im.set_extent([0, outputdata.shape[1], tmax, 0])
+        self.im.set_clim(-vmax, vmax)
+        self.ax.set_xlim(0, outputdata.shape[1])
+        self.ax.set_ylim(tmax, 0)
+        if 'E' in rxcomponent:
+            self.cb.set_label('Field strength [V/m]')
+        elif 'H' in rxcomponent:
+            self.cb.set_label('Field strength [A/m]')
+        elif 'I' in rxcomponent:
+            self.cb.set_label('Current [A]')
+
+        base_filename = os.path.basename(filename)
+        save_filename = f"{os.path.splitext(base_filename)[0]}_rx{rxnumber}_{rxcomponent}.png"
+        save_path = os.path.join(save_dir, save_filename)
+        self.fig.savefig(save_path, dpi=self.dpi, bbox_inches='tight')
+        return save_path
+
+    def render_file(self, filename, rxcomponent, save_dir):
+        """Renders every receiver of filename. Returns the saved image paths."""
+        with h5py.File(filename, 'r') as f:
+            nrx = f.attrs['nrx']
+        return [self.render(filename, rx, rxcomponent, save_dir) for rx in range(1, nrx + 1)]
+
+
+# One renderer per process, created on first use
+_renderer = None
+_renderer_options = {}
+
+
+def _init_worker(options):
+    global _renderer_options
+    _renderer_options = options
+
+
+def _get_renderer():
+    global _renderer
+    if _renderer is None:
+        _renderer = BscanRenderer(**_renderer_options)
+    return _renderer
+
+
+def _render_job(args):
+    filename, rxcomponent, save_dir = args
+    try:
+        return filename, _get_renderer().render_file(filename, rxcomponent, save_dir), None
+    except Exception as e:
+        return filename, [], str(e)
+
+
+def default_save_dir():
+    return os.path.join(os.getcwd(), 'saved_bscans')
+
+
+def render_bscan(filename, rxcomponent='Ez', save_dir=None):
+    """Renders one file in this process, reusing the process' figure."""
+    save_dir = save_dir or default_save_dir()
+    os.makedirs(save_dir, exist_ok=True)
+    return _get_renderer().render_file(filename, rxcomponent, save_dir)
+
+
+def render_pool(workers=None, dpi=300):
+    """Process pool whose workers each hold one BscanRenderer, for render_bscans(pool=...)."""
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=({'dpi': dpi},))
+
+
+def render_bscans(filenames, rxcomponent='Ez', save_dir=None, workers=None, dpi=300, pool=None):
+    """Renders many files across a process pool. Returns {filename: [image paths]}.
+
+    Pass a render_pool() as pool to keep the workers (and their figures) between
+    calls; workers and dpi then come from the pool.
+    """
+    if pool is None:
+        with render_pool(workers, dpi) as pool:
+            return render_bscans(filenames, rxcomponent, save_dir, pool=pool)
+    save_dir = save_dir or default_save_dir()
+    os.makedirs(save_dir, exist_ok=True)
+    jobs = [(filename, rxcomponent, save_dir) for filename in filenames]
+    results = {}
+    for i, (filename, paths, error) in enumerate(pool.map(_render_job, jobs, chunksize=8)):
+        if error:
+            print(f"[✘] {filename}: {error}")
+        else:
+            print(f"[✔] ({i + 1}/{len(jobs)}) Saved B-scan image(s) for {filename}")
+        results[filename] = paths
+    return results
+
+
+if __name__ == "__main__":
+
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(description='Plots B-scan images of many merged output files.',
+                                     usage='python batch_plot_Bscan.py outputfiles [outputfiles ...] --component Ez')
+    parser.add_argument('outputfiles', nargs='*', help='merged output files (or folders of them)')
+    parser.add_argument('--manifest', default=None, help='sweep manifest to take the merged files from')
+    parser.add_argument('--where', nargs='*', default=[], help='with --manifest, parameter filters as name=value')
+    parser.add_argument('--component', default='Ez', help='name of output component to be plotted',
+                        choices=['Ex', 'Ey', 'Ez', 'Hx', 'Hy', 'Hz', 'Ix', 'Iy', 'Iz'])
+    parser.add_argument('--workers', type=int, default=None, help='number of rendering processes')
+    parser.add_argument('--dpi', type=int, default=300, help='resolution of the saved images')
+    parser.add_argument('--save-dir', default=None, help='folder for the images (default ./saved_bscans)')
+    args = parser.parse_args()
+
+    filenames = []
+    for path in args.outputfiles:
+        if os.path.isdir(path):
+            filenames += sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith('_merged.out'))
+        else:
+            filenames.append(path)
+
+    if args.manifest:
+        with SweepManifest(args.manifest) as manifest:
+            filenames += manifest.merged_files(**parse_criteria(args.where))
+
+    render_bscans(filenames, args.component, args.save_dir, args.workers, args.dpi)
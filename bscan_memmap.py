@@ -0,0 +1,131 @@
+"""Memory-mapped B-scan arrays for training.
+
+convert() reads merged outputs once (through the same get_output_data call
+plot_Bscan.py uses) into one contiguous .npy file of shape
+(N x traces x samples) plus a CSV parameter table. BscanMemmap then maps that
+file, so slicing a batch is a view on the page cache instead of N h5py opens.
+"""
+
+import os
+import csv
+import argparse
+
+import h5py
+import numpy as np
+
+from tools.outputfiles_merge import get_output_data
+from dataset_store import parse_sweep_name
+from sweep_manifest import SweepManifest
+
+PARAM_FIELDS = ["index", "source", "material", "radius", "depth", "angle"]
+
+
+def convert(filenames, prefix, rxcomponent='Ez', rxnumber=1, dtype='float32', params=None):
+    """Writes prefix.npy (N x traces x samples) and prefix_params.csv.
+
+    Args:
+        filenames (list): Merged output files, all with the same number of samples and traces.
+        prefix (str): Path and name of the files to write, without extension.
+        rxcomponent (str): Receiver output to store.
+        rxnumber (int): Receiver number to store.
+        dtype (str): 'float16' or 'float32'.
+        params (list): Optional parameter dicts per file; parsed from the file names if None.
+
+    Returns:
+        shape (tuple): Shape of the written array.
+    """
+    with h5py.File(filenames[0], 'r') as f:
+        samples, traces = f[f'/rxs/rx{rxnumber}/{rxcomponent}'].shape
+
+    shape = (len(filenames), traces, samples)
+    array = np.lib.format.open_memmap(prefix + '.npy', mode='w+', dtype=dtype, shape=shape)
+
+    with open(prefix + '_params.csv', 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=PARAM_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        for i, filename in enumerate(filenames):
+            outputdata, dt = get_output_data(filename, rxnumber, rxcomponent)
+            if outputdata.shape != (samples, traces):
+                raise ValueError(f"{filename}: shape {outputdata.shape} differs from {(samples, traces)}")
+            array[i] = outputdata.T
+
+            row = dict(params[i]) if params else (parse_sweep_name(filename) or {})
+            row.update(index=i, source=os.path.basename(filename))
+            writer.writerow(row)
+
+    array.flush()
+    del array
+    return shape
+
+
+class BscanMemmap:
+    """Read-only view of a converted dataset.
+
+    data[i] and data[start:stop] are zero-copy views of the mapped file; only
+    take() with arbitrary indices has to copy.
+    """
+
+    def __init__(self, prefix):
+        self.data = np.load(prefix + '.npy', mmap_mode='r')
+        with open(prefix + '_params.csv', 'r', newline='') as f:
+            self.params = list(csv.DictReader(f))
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    def __getitem__(self, index):
+        return self.data[index]
+
+    def batch(self, start, stop):
+        """Contiguous batch as a view (no copy)."""
+        return self.data[start:stop]
+
+    def take(self, indices):
+        """Batch of arbitrary entries in the given order (copied into memory).
+
+        Reads in file order, which is faster on a memmap, then puts the rows
+        back in the order asked for so they line up with labels and params.
+        """
+        indices = np.asarray(indices)
+        order = np.argsort(indices, kind="stable")
+        return self.data[indices[order]][np.argsort(order)]
+
+    def where(self, **criteria):
+        """Indices whose parameters equal the given values, e.g. where(material='clay')."""
+        indices = []
+        for row in self.params:
+            if all(str(row.get(name)) == str(value) for name, value in criteria.items()):
+                indices.append(int(row['index']))
+        return indices
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Converts merged outputs into a memory-mapped NumPy dataset.',
+                                     usage='python bscan_memmap.py prefix merged_dir [merged_dir ...]')
+    parser.add_argument('prefix', help='output path without extension (writes prefix.npy and prefix_params.csv)')
+    parser.add_argument('inputs', nargs='*', help='merged output files or folders of them')
+    parser.add_argument('--manifest', default=None,
+                        help='sweep manifest; supplies the parameters, and the files when no inputs are given')
+    parser.add_argument('--component', default='Ez', help='receiver output to store',
+                        choices=['Ex', 'Ey', 'Ez', 'Hx', 'Hy', 'Hz', 'Ix', 'Iy', 'Iz'])
+    parser.add_argument('--rx', type=int, default=1, help='receiver number to store')
+    parser.add_argument('--dtype', default='float32', choices=['float16', 'float32'])
+    args = parser.parse_args()
+
+    filenames = []
+    for path in args.inputs:
+        if os.path.isdir(path):
+            filenames += sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith('_merged.out'))
+        else:
+            filenames.append(path)
+
+    params = None
+    if args.manifest:
+        with SweepManifest(args.manifest) as manifest:
+            if not args.inputs:
+                filenames = manifest.merged_files()
+            params = [manifest.params(filename) or parse_sweep_name(filename) or {} for filename in filenames]
+
+    shape = convert(filenames, args.prefix, args.component, args.rx, args.dtype, params)
+    print(f"Wrote {args.prefix}.npy with shape {shape} ({args.dtype})")
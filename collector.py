@@ -1,61 +1,102 @@
 import os
-import re
-import time
-import subprocess
-from collections import defaultdict
+
+from collector_watch import watch, wait_for_merged
+from trace_index import TraceIndex, ExpectedCounts
+from batch_ledger import JobLedger
+from merge_engine import merge_files
+from batch_plot_Bscan import render_bscan
+from sweep_manifest import SweepManifest, ManifestIndex
 
 # Define the working directory (current directory in this case)
 directory = '.'
 
-# Dictionary to hold grouped .out files by base name (excluding index suffix)
-file_groups = defaultdict(list)
+# Upper limit on the trace files a complete group must have (the -n the batch
+# was run with). The actual count per group is the -n simulate_Bscan.py recorded
+# in its job ledger or, failing that, how many #src_steps/#rx_steps fit in the
+# domain outside the PML according to the group's .in file.
+MAX_TRACES = 225
+# Folder holding the .in files the outputs came from (and their batch_ledger.jsonl)
+input_dir = directory
+
+# Keep watching the directory for groups that complete while simulations are
+# still running. Set to False for a single pass over the current files.
+WATCH = True
+POLL_INTERVAL = 5       # seconds between directory scans
+IDLE_TIMEOUT = 600      # stop watching after this long without new files
 
 # ----------------------------------------------------------------------
 # Step 1: Identify and group related output files
 # ----------------------------------------------------------------------
 # Files are expected to follow the pattern: baseName_index.out (e.g., scan_1.out, scan_2.out, ...)
 # Files with the same baseName are grouped together for batch processing.
-for filename in os.listdir(directory):
-    if filename.endswith('.out'):
-        # Match files ending in "_<number>.out" (e.g., model_123.out)
-        match = re.match(r"(.+_)\d+\.out", filename)
-        if match:
-            # Extract the base name without the trailing underscore for consistency
-            base_name = match.group(1)[:-1]
-            file_groups[base_name].append(filename)
+# Match files ending in "_<number>.out" (e.g., model_123.out); the group is the
+# base name without the trailing underscore for consistency
+GROUP_PATTERN = r"(.+)_\d+\.out"
+# Manifest written by the generator. When set, the trace files each model
+# should produce are looked up there instead of listing the directory.
+MANIFEST_PATH = None  # e.g. "simulations_radii_depth_pvc/manifest.sqlite"
+
 
 # ----------------------------------------------------------------------
-# Step 2: Process only file groups that have exactly 225 members
+# Step 2: Process file groups as soon as they have all their members
 # ----------------------------------------------------------------------
 # This ensures we're only merging and plotting datasets that are complete
-for base_name, files in file_groups.items():
-    if len(files) == 225:
-        print(f"Processing {base_name}_ with 225 files")
+def process_group(base_name, files):
+    print(f"Processing {base_name}_ with {len(files)} files")
 
-        # Attempt to merge files using a module named `tools.outputfiles_merge`
-        # The argument passed is the prefix used to identify the group of files
+    # Construct the expected merged output filename
+    # The merged file follows the naming of tools.outputfiles_merge: baseName__merged.out
+    # (in the output folder the manifest records, when there is one)
+    merged_filename = index.merged_path(base_name)
+
+    # Merge in-process; the group's files are passed in trace order
+    try:
+        files = sorted(files, key=lambda f: int(f[len(base_name) + 1:-len(".out")]))
+        merge_files(merged_filename[:-len("_merged.out")],
+                    files=[index.trace_path(base_name, f) for f in files], outputfile=merged_filename)
+    except (OSError, KeyError) as e:
+        print(f"Merge failed for {base_name}_: {e}")
+        return  # Skip to the next group if merge fails
+    index.mark_complete(base_name)
+
+    # Only plot once the merged file is closed and holds every trace
+    if wait_for_merged(merged_filename, len(files)):
         try:
-            subprocess.run(['python', '-m', 'tools.outputfiles_merge', f"{base_name}_"], check=True)
-        except subprocess.CalledProcessError as e:
-            print(f"Merge failed for {base_name}_: {e}")
-            continue  # Skip to the next group if merge fails
-
-        # Wait for the merged file to be generated before plotting
-        time.sleep(7)
-
-        # Construct the expected merged output filename
-        # The merged file is assumed to follow the naming: baseName__merged.out
-        merged_filename = f"{base_name}__merged.out"
-
-        # Check if the merged file exists before attempting to plot
-        if os.path.exists(merged_filename):
-            try:
-                # Plot B-scan of the merged output using 'Ez' field
-                subprocess.run(['python', '-m', 'tools.plot_Bscan', merged_filename, 'Ez'], check=True)
-            except subprocess.CalledProcessError as e:
-                print(f"Plotting failed for {merged_filename}: {e}")
-        else:
-            print(f"Merged file not found: {merged_filename}")
+            # Plot B-scan of the merged output using 'Ez' field, reusing one figure
+            for save_path in render_bscan(merged_filename, 'Ez'):
+                print(f"Saved B-scan image to: {save_path}")
+        except Exception as e:
+            print(f"Plotting failed for {merged_filename}: {e}")
     else:
-        # Informative message for incomplete groups
-        print(f"Skipping {base_name}_ — only {len(files)} files found (needs 225)")
+        print(f"Merged file not found or incomplete: {merged_filename}")
+
+
+# Groups merged elsewhere (e.g. restored from the result cache) are only plotted
+def process_merged(base_name, merged_filename):
+    print(f"Plotting already merged {base_name}_")
+    index.mark_complete(base_name)
+    try:
+        for save_path in render_bscan(merged_filename, 'Ez'):
+            print(f"Saved B-scan image to: {save_path}")
+    except Exception as e:
+        print(f"Plotting failed for {merged_filename}: {e}")
+
+
+# -n of every run, as recorded by simulate_Bscan.py
+ledger_path = os.path.join(input_dir, "batch_ledger.jsonl")
+ledger = JobLedger(ledger_path) if os.path.exists(ledger_path) else None
+
+if MANIFEST_PATH:
+    # Stat the trace files the manifest expects instead of listing the directory
+    index = ManifestIndex(SweepManifest(MANIFEST_PATH), MAX_TRACES, ledger)
+    expected = index.expected
+else:
+    # Persistent index of trace files, so repeat runs only look at new files
+    index = TraceIndex(directory, GROUP_PATTERN)
+    expected = ExpectedCounts(input_dir, MAX_TRACES, ledger)
+
+
+if __name__ == "__main__":
+    watch(directory, GROUP_PATTERN, expected, process_group, scan=index.scan,
+          poll_interval=POLL_INTERVAL, idle_timeout=IDLE_TIMEOUT, once=not WATCH,
+          merged=index.unprocessed, process_merged=process_merged)
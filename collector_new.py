@@ -1,41 +1,186 @@
 import os
-import re
+import csv
 import time
-import subprocess
-from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from collector_watch import watch, wait_for_merged
+from trace_index import TraceIndex, ExpectedCounts
+from batch_ledger import JobLedger
+from merge_engine import merge_files, merge_groups_parallel, print_timing_report
+from dataset_store import BscanDatasetWriter
+from sweep_manifest import SweepManifest, ManifestIndex
 
 directory = '.'  # current folder
-file_groups = defaultdict(list)
+input_dir = directory  # folder with the .in files and batch_ledger.jsonl, used for each group's expected trace count
+MAX_TRACES = 225       # caps the count derived from the .in file when the ledger has no -n for it
+
+# Keep polling for groups that complete while gprMax is still running
+WATCH = True
+POLL_INTERVAL = 5       # seconds between directory scans
+IDLE_TIMEOUT = 600      # stop after this long without new files
+
+# Number of groups merged at the same time in separate processes (1 = one after
+# another). Merging is mostly reading, so this bounds concurrent disk I/O.
+PARALLEL_MERGES = 4
+# Processes rendering the B-scan images of a batch of merged groups
+PLOT_WORKERS = 4
+# Per-group merge timings are appended here
+TIMING_REPORT = "merge_timings.csv"
+# Consolidated HDF5 store every merged B-scan is appended to (None to disable)
+DATASET_PATH = None  # e.g. "sweep_dataset.h5"
+DATASET_SHARD_SIZE = None  # entries per shard file, None for a single file
 
 # Group files based on base name (excluding final _###)
-for filename in os.listdir(directory):
-    if filename.endswith(".out"):
-        match = re.match(r"(gpr_.+)_\d+\.out", filename)
-        if match:
-            base_name = match.group(1)
-            file_groups[base_name].append(filename)
+GROUP_PATTERN = r"(gpr_.+)_\d+\.out"
+# Manifest written by the generator. When set, trace files and parameters are
+# looked up there instead of listing the folder and parsing file names.
+MANIFEST_PATH = None  # e.g. "simulations_full_strategy_split/manifest.sqlite"
+
+merge_stats = []
+merge_wall_time = 0.0  # time spent merging, excluding idle polling
+dataset = None
+manifest = None
+# Set up in __main__ only: worker processes re-import this module (as
+# __mp_main__ on Windows) and must not load the index, ledger or matplotlib
+index = None
+merge_pool = None   # one pool each for the whole watch, not one per batch
+plot_pool = None
+
+
+def store_in_dataset(merged_filename):
+    if dataset is None:
+        return
+    try:
+        params = manifest.params(merged_filename) if manifest is not None else None
+        dataset.append_file(merged_filename, params)
+    except (OSError, KeyError, ValueError) as e:
+        print(f"❌ Could not add {merged_filename} to the dataset: {e}")
+
 
-for base_name, files in file_groups.items():
-    if len(files) == 225:
-        print(f"✅ Processing {base_name} with 225 files")
+def merge_job(base_name, files):
+    """(basefilename, trace files in order, merged filename) for a group."""
+    # Same name tools.outputfiles_merge gives the "<base>_" prefix: "<base>__merged.out",
+    # in the folder the index (or the manifest) says the group's outputs are in
+    merged_filename = index.merged_path(base_name)
+    files = sorted(files, key=lambda f: int(f[len(base_name) + 1:-len(".out")]))
+    return (merged_filename[:-len("_merged.out")],
+            [index.trace_path(base_name, f) for f in files], merged_filename)
 
+
+def merged_ready(base_name, merged_filename, expected):
+    # ⏳ Wait until the merged file is closed and holds every trace
+    if wait_for_merged(merged_filename, expected):
+        return True
+    print(f"❌ Merged file not found or incomplete for {base_name}.")
+    return False
+
+
+def process_group(base_name, files):
+    global merge_wall_time
+    print(f"✅ Processing {base_name} with {len(files)} files")
+
+    basefilename, files, merged_filename = merge_job(base_name, files)
+    stats = {}
+    try:
+        merge_files(basefilename, files=files, outputfile=merged_filename, stats=stats)
+    except (OSError, KeyError) as e:
+        print(f"❌ Merge failed for {base_name}: {e}")
+        return
+    merge_stats.append(stats)
+    merge_wall_time += stats["wall_s"]
+    index.mark_complete(base_name)
+
+    if merged_ready(base_name, merged_filename, len(files)):
+        store_in_dataset(merged_filename)
         try:
-            subprocess.run(['python', '-m', 'tools.outputfiles_merge', base_name], check=True)
-        except subprocess.CalledProcessError as e:
-            print(f"❌ Merge failed for {base_name}: {e}")
+            render_bscan(merged_filename, 'Ez')
+        except Exception as e:
+            print(f"❌ Plotting failed for {merged_filename}: {e}")
+
+
+def process_merged(base_name, merged_filename):
+    # Merged elsewhere (e.g. restored from the result cache): only store and plot
+    print(f"✅ Processing already merged {base_name}")
+    index.mark_complete(base_name)
+    store_in_dataset(merged_filename)
+    try:
+        render_bscan(merged_filename, 'Ez')
+    except Exception as e:
+        print(f"❌ Plotting failed for {merged_filename}: {e}")
+
+
+def process_batch(groups):
+    global merge_wall_time
+    print(f"✅ Merging {len(groups)} complete groups with {PARALLEL_MERGES} workers")
+    jobs = {base_name: merge_job(base_name, files) for base_name, files in groups}
+    bases = {job[0]: base_name for base_name, job in jobs.items()}
+    batch_start = time.time()
+    to_plot = []
+
+    for stats in merge_groups_parallel(list(jobs.values()), pool=merge_pool):
+        merge_stats.append(stats)
+        base_name = bases[stats["base"]]
+        if "error" in stats:
+            print(f"❌ Merge failed for {base_name}: {stats['error']}")
             continue
+        print(f"✅ Merged {base_name} in {stats['wall_s']:.1f} s")
+        index.mark_complete(base_name)
+        if merged_ready(base_name, stats["outputfile"], stats["files"]):
+            store_in_dataset(stats["outputfile"])
+            to_plot.append(stats["outputfile"])
+    merge_wall_time += time.time() - batch_start
+
+    # Render the whole batch at once; each worker keeps one figure for all its files
+    if to_plot:
+        render_bscans(to_plot, 'Ez', pool=plot_pool)
+
 
-        # ⏳ Wait for file to be written to disk
-        time.sleep(7)
+def write_timings(path):
+    fields = ["base", "files", "bytes_read", "bytes_written", "read_s", "write_s", "wall_s", "cpu_s", "error"]
+    new_file = not os.path.exists(path)
+    with open(path, "a", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+        if new_file:
+            writer.writeheader()
+        writer.writerows(merge_stats)
 
-        merged_filename = f"{base_name}__merged.out"
 
-        if os.path.exists(merged_filename):
-            try:
-                subprocess.run(['python', '-m', 'tools.plot_Bscan', merged_filename, 'Ez'], check=True)
-            except subprocess.CalledProcessError as e:
-                print(f"❌ Plotting failed for {merged_filename}: {e}")
-        else:
-            print(f"❌ Merged file not found for {base_name} even after waiting.")
+if __name__ == "__main__":
+    # Only the main process plots, so matplotlib is imported here
+    from batch_plot_Bscan import render_bscan, render_bscans, render_pool
+
+    # -n of every run, as recorded by simulate_Bscan.py
+    ledger_path = os.path.join(input_dir, "batch_ledger.jsonl")
+    ledger = JobLedger(ledger_path) if os.path.exists(ledger_path) else None
+
+    if MANIFEST_PATH:
+        # Stat the trace files the manifest expects instead of listing the folder
+        manifest = SweepManifest(MANIFEST_PATH)
+        index = ManifestIndex(manifest, MAX_TRACES, ledger)
+        expected = index.expected
+    else:
+        # Persistent index of trace files, so repeat runs only look at new files
+        index = TraceIndex(directory, GROUP_PATTERN)
+        expected = ExpectedCounts(input_dir, MAX_TRACES, ledger)
+
+    if DATASET_PATH:
+        dataset = BscanDatasetWriter(os.path.join(directory, DATASET_PATH),
+                                     shard_size=DATASET_SHARD_SIZE, mode="a")
+    if PARALLEL_MERGES > 1:
+        with ProcessPoolExecutor(max_workers=PARALLEL_MERGES) as merge_pool, \
+                render_pool(PLOT_WORKERS) as plot_pool:
+            watch(directory, GROUP_PATTERN, expected, process_batch=process_batch, scan=index.scan,
+                  poll_interval=POLL_INTERVAL, idle_timeout=IDLE_TIMEOUT, once=not WATCH,
+                  merged=index.unprocessed, process_merged=process_merged)
     else:
-        print(f"⏩ Skipping {base_name} — only {len(files)} files found (needs 225)")
+        watch(directory, GROUP_PATTERN, expected, process_group, scan=index.scan,
+              poll_interval=POLL_INTERVAL, idle_timeout=IDLE_TIMEOUT, once=not WATCH,
+              merged=index.unprocessed, process_merged=process_merged)
+
+    if dataset is not None:
+        dataset.close()
+        print(f"Added {dataset.total} B-scans to {DATASET_PATH}")
+
+    if merge_stats:
+        print_timing_report(merge_stats, merge_wall_time, PARALLEL_MERGES)
+        write_timings(os.path.join(directory, TIMING_REPORT))
@@ -0,0 +1,124 @@
+import os
+import re
+import time
+
+import h5py
+
+
+def scan_groups(directory, pattern):
+    r"""Groups trace files by base name.
+
+    pattern is a regex whose first group is the base name, e.g. r"(gpr_.+)_\d+\.out".
+    Returns {base_name: {filename: (size, mtime)}}.
+    """
+    regex = re.compile(pattern)
+    groups = {}
+    with os.scandir(directory) as it:
+        for entry in it:
+            if not entry.name.endswith(".out"):
+                continue
+            match = regex.match(entry.name)
+            if match:
+                st = entry.stat()
+                groups.setdefault(match.group(1), {})[entry.name] = (st.st_size, st.st_mtime)
+    return groups
+
+
+def merged_file_ready(path, expected_traces):
+    """True once path is a closed, readable merged file holding expected_traces traces."""
+    if not os.path.exists(path):
+        return False
+    try:
+        with h5py.File(path, "r") as f:
+            if f.attrs["nrx"] == 0:
+                return False
+            rx = f["rxs/rx1"]
+            component = next(iter(rx.values()))
+            return component.ndim == 2 and component.shape[1] == expected_traces
+    except (OSError, KeyError, StopIteration):
+        # Still being written, or not an output file (yet)
+        return False
+
+
+def wait_for_merged(path, expected_traces, timeout=60, interval=0.5):
+    """Polls until the merged file is complete rather than sleeping a fixed time."""
+    deadline = time.time() + timeout
+    while True:
+        if merged_file_ready(path, expected_traces):
+            return True
+        if time.time() >= deadline:
+            return False
+        time.sleep(interval)
+
+
+def watch(directory, pattern, expected_traces, process_group=None, poll_interval=5,
+          idle_timeout=600, once=False, process_batch=None, scan=None,
+          merged=None, process_merged=None):
+    """Calls process_group(base_name, files) as soon as a group is complete.
+
+    expected_traces is either a fixed count or a function of the base name.
+    scan replaces the plain directory listing, e.g. with TraceIndex.scan.
+
+    If process_batch is given instead, it is called once per poll with the list
+    of (base_name, files) that became complete, so they can be handled together.
+
+    merged, if given, returns {base_name: merged path} of groups that are
+    already merged but not processed (e.g. restored from the result cache);
+    each is passed to process_merged(base_name, path) once, after every scan.
+
+    A group is complete when it has expected_traces files whose sizes and mtimes
+    did not change between two polls, i.e. gprMax has finished writing them.
+    Each group is processed once. With once=True a single pass is made (the old
+    collector behaviour); otherwise polling stops after idle_timeout seconds
+    without new files.
+    """
+    done = set()
+    previous = {}
+    last_change = time.time()
+    if scan is None:
+        scan = lambda: scan_groups(directory, pattern)
+    if not callable(expected_traces):
+        count = expected_traces
+        expected_traces = lambda base_name: count
+
+    while True:
+        groups = scan()
+        if groups != previous:
+            last_change = time.time()
+
+        ready = []
+        for base_name, files in sorted(groups.items()):
+            if base_name in done:
+                continue
+            expected = expected_traces(base_name)
+            if len(files) != expected:
+                if once:
+                    print(f"Skipping {base_name} — only {len(files)} files found (needs {expected})")
+                continue
+            if not once and previous.get(base_name) != files:
+                # Wait for one more poll to be sure the last trace is closed
+                continue
+            done.add(base_name)
+            ready.append((base_name, sorted(files)))
+
+        if merged is not None:
+            for base_name, path in sorted(merged().items()):
+                if base_name not in done:
+                    done.add(base_name)
+                    process_merged(base_name, path)
+
+        if ready and process_batch is not None:
+            process_batch(ready)
+        elif ready:
+            for base_name, files in ready:
+                process_group(base_name, files)
+
+        if once:
+            return done
+        incomplete = [b for b, files in groups.items() if b not in done]
+        if time.time() - last_change > idle_timeout:
+            if incomplete:
+                print(f"No new files for {idle_timeout} s, {len(incomplete)} groups still incomplete.")
+            return done
+        previous = groups
+        time.sleep(poll_interval)
@@ -0,0 +1,159 @@
+"""Static cost estimate of gprMax models before they are submitted.
+
+Everything is derived from the .in file: grid cells, the CFL time step,
+iterations, an approximate memory footprint (same terms as gprMax's own
+estimate) and the runtime. Runtime is cells x iterations x traces divided by a
+throughput in cell updates per second, which is calibrated from the wall times
+of earlier runs recorded in a job ledger or a calibration CSV.
+"""
+
+import os
+import csv
+import argparse
+import statistics
+
+from in_parser import read_commands, grid_cells, time_step, iterations, max_traces
+
+# Cell updates per second of one run when no calibration is available yet
+DEFAULT_CELL_RATE = 2e8
+# Fixed overhead of a gprMax process (Python, libraries, geometry build)
+PROCESS_OVERHEAD_BYTES = 50e6
+
+CALIBRATION_FIELDS = ["input", "cells", "iterations", "traces", "wall_time"]
+
+
+def memory_estimate(commands, precision="single"):
+    """Approximate memory of one model in bytes.
+
+    Mirrors gprMax's basic estimate: field, ID, solid and rigid arrays over the
+    grid plus a fixed overhead, with the receiver output arrays added on top.
+    """
+    nx, ny, nz = grid_cells(commands)
+    itemsize = 4 if precision == "single" else 8
+    cells = nx * ny * nz
+    nodes = (nx + 1) * (ny + 1) * (nz + 1)
+    solid = cells * 4           # uint32
+    rigid = (12 + 6) * cells    # int8
+    fields = 6 * nodes * itemsize
+    ids = 6 * nodes * 4         # uint32
+    nrx = sum(1 for cmd, _ in commands if cmd == "#rx")
+    receivers = nrx * 9 * iterations(commands) * itemsize
+    return int(PROCESS_OVERHEAD_BYTES + solid + rigid + fields + ids + receivers)
+
+
+def work(commands, n=None):
+    """(cells, iterations, traces) of a run; traces defaults to as many as fit."""
+    nx, ny, nz = grid_cells(commands)
+    if n is None:
+        n = max_traces(commands) or 1
+    return nx * ny * nz, iterations(commands), n
+
+
+class Calibration:
+    """Measured throughput (cell updates per second) from earlier runs."""
+
+    def __init__(self, samples=None):
+        self.samples = samples or []  # dicts with CALIBRATION_FIELDS
+
+    def add(self, input_path, wall_time, n=None):
+        cells, iters, traces = work(read_commands(input_path), n)
+        self.samples.append({"input": input_path, "cells": cells, "iterations": iters,
+                             "traces": traces, "wall_time": wall_time})
+
+    @property
+    def cell_rate(self):
+        rates = [s["cells"] * s["iterations"] * s["traces"] / s["wall_time"]
+                 for s in self.samples if s["wall_time"]]
+        # Median, so a run that waited on a busy machine doesn't skew the estimate
+        return statistics.median(rates) if rates else DEFAULT_CELL_RATE
+
+    @classmethod
+    def from_ledger(cls, ledger):
+        """Samples from the finished, non-cached runs of a JobLedger."""
+        calibration = cls()
+        for record in ledger.jobs.values():
+            if record.get("state") != "done" or record.get("cached") or not record.get("wall_time"):
+                continue
+            if not os.path.exists(record["input"]):
+                continue
+            try:
+                calibration.add(record["input"], record["wall_time"], record.get("n"))
+            except (TypeError, ValueError, IndexError):
+                continue
+        return calibration
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return cls()
+        with open(path, "r", newline="") as f:
+            samples = [{"input": row["input"], "cells": int(row["cells"]),
+                        "iterations": int(row["iterations"]), "traces": int(row["traces"]),
+                        "wall_time": float(row["wall_time"])} for row in csv.DictReader(f)]
+        return cls(samples)
+
+    def save(self, path):
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=CALIBRATION_FIELDS)
+            writer.writeheader()
+            writer.writerows(self.samples)
+
+
+def estimate(filepath, n=None, calibration=None, precision="single"):
+    """Cost estimate of running filepath with -n n traces.
+
+    Returns a dict with cells, dt, iterations, traces, memory_bytes,
+    seconds_per_trace and seconds.
+    """
+    commands = read_commands(filepath)
+    cells, iters, traces = work(commands, n)
+    rate = calibration.cell_rate if calibration is not None else DEFAULT_CELL_RATE
+    seconds_per_trace = cells * iters / rate
+    return {"input": filepath, "cells": cells, "dt": time_step(commands), "iterations": iters,
+            "traces": traces, "memory_bytes": memory_estimate(commands, precision),
+            "seconds_per_trace": seconds_per_trace, "seconds": seconds_per_trace * traces}
+
+
+def format_bytes(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+if __name__ == "__main__":
+
+    from batch_ledger import JobLedger
+
+    parser = argparse.ArgumentParser(description='Estimates the cost of gprMax models from their .in files.',
+                                     usage='python cost_estimator.py models_dir --ledger batch_ledger.jsonl')
+    parser.add_argument('inputs', nargs='+', help='.in files or folders of them')
+    parser.add_argument('-n', type=int, default=None, help='traces per run (default: as many as fit)')
+    parser.add_argument('--ledger', default=None, help='job ledger to calibrate the runtime from')
+    parser.add_argument('--calibration', default=None, help='calibration CSV to read (and update with --ledger)')
+    args = parser.parse_args()
+
+    calibration = Calibration.load(args.calibration) if args.calibration else Calibration()
+    if args.ledger:
+        calibration.samples += Calibration.from_ledger(JobLedger(args.ledger)).samples
+        if args.calibration:
+            calibration.save(args.calibration)
+    print(f"Throughput: {calibration.cell_rate:.3g} cell updates/s "
+          f"({len(calibration.samples)} calibration runs)")
+
+    filenames = []
+    for path in args.inputs:
+        if os.path.isdir(path):
+            filenames += sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith('.in'))
+        else:
+            filenames.append(path)
+
+    total = 0.0
+    for filename in filenames:
+        e = estimate(filename, args.n, calibration)
+        total += e["seconds"]
+        print(f"{os.path.basename(filename)}: {e['cells']:,} cells, dt {e['dt']:.3e} s, "
+              f"{e['iterations']} iterations x {e['traces']} traces, {format_bytes(e['memory_bytes'])}, "
+              f"{e['seconds_per_trace']:.1f} s/trace, {e['seconds'] / 3600:.2f} h")
+    print(f"Total: {total / 3600:.1f} h for {len(filenames)} models")
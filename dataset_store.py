@@ -0,0 +1,183 @@
+"""Consolidated HDF5 store for whole sweeps of merged B-scans.
+
+Every merged B-scan becomes one row of a chunked, compressed (N x samples x
+traces) dataset, with its sweep parameters kept in parallel 1-D datasets under
+/params, so training code can read contiguous slices from one file instead of
+opening millions of small .out files.
+"""
+
+import os
+import re
+import argparse
+
+import h5py
+import numpy as np
+
+from sweep_manifest import SweepManifest
+
+# Sweep parameters encoded in the generate5d.py file names, e.g. gpr_clay_r0_05_d0_2_a15_
+SWEEP_NAME = re.compile(r"gpr_(?P<material>.+)_r(?P<radius>\d+(?:_\d+)?)_d(?P<depth>\d+(?:_\d+)?)_a(?P<angle>\d+)")
+
+NUMERIC_PARAMS = ("radius", "depth", "angle")
+STRING_PARAMS = ("material", "source")
+
+
+def parse_sweep_name(filename):
+    """Sweep parameters from a generate5d.py style file name, or None."""
+    match = SWEEP_NAME.search(os.path.basename(filename))
+    if not match:
+        return None
+    params = {"material": match.group("material")}
+    for name in NUMERIC_PARAMS:
+        params[name] = float(match.group(name).replace("_", "."))
+    return params
+
+
+def read_bscan(filename, rxcomponent="Ez", rxnumber=1):
+    """(outputdata, dt) of one receiver component of a merged output file."""
+    with h5py.File(filename, "r") as f:
+        return f[f"/rxs/rx{rxnumber}/{rxcomponent}"][()], f.attrs["dt"]
+
+
+class BscanDatasetWriter:
+    """Appends merged B-scans to one HDF5 file, or to shards of shard_size entries.
+
+    Args:
+        path (str): Output file. With shard_size, shards are named path_00000.h5, ...
+        rxcomponent (str): Receiver output stored for every entry.
+        rxnumber (int): Receiver stored for every entry.
+        dtype (str): Storage type of the B-scans.
+        compression (str): h5py compression filter.
+        shard_size (int): Entries per file (None = a single file).
+        mode (str): "w" to start a new store, "a" to add to an existing one.
+    """
+
+    def __init__(self, path, rxcomponent="Ez", rxnumber=1, dtype="float32",
+                 compression="gzip", shard_size=None, mode="w"):
+        self.path = path
+        self.rxcomponent = rxcomponent
+        self.rxnumber = rxnumber
+        self.dtype = dtype
+        self.compression = compression
+        self.shard_size = shard_size
+        self.shard = 0
+        self.f = None
+        self.count = 0
+        self.total = 0
+        self.mode = mode
+        if mode == "a" and shard_size is not None:
+            # Continue with a fresh shard after the existing ones
+            while os.path.exists(self.shard_path()):
+                self.shard += 1
+
+    def shard_path(self):
+        if self.shard_size is None:
+            return self.path
+        root, ext = os.path.splitext(self.path)
+        return f"{root}_{self.shard:05d}{ext or '.h5'}"
+
+    def open_shard(self, shape, dt):
+        path = self.shard_path()
+        if self.mode == "a" and os.path.exists(path):
+            self.f = h5py.File(path, "a")
+            self.count = self.f["bscans"].shape[0]
+            return
+        self.f = h5py.File(path, "w")
+        self.f.attrs["rxcomponent"] = self.rxcomponent
+        self.f.attrs["rxnumber"] = self.rxnumber
+        self.f.attrs["dt"] = dt
+        # One chunk per B-scan keeps single-entry reads to one decompression
+        self.f.create_dataset("bscans", shape=(0,) + shape, maxshape=(None,) + shape,
+                              chunks=(1,) + shape, dtype=self.dtype, compression=self.compression)
+        for name in NUMERIC_PARAMS:
+            self.f.create_dataset(f"params/{name}", shape=(0,), maxshape=(None,), dtype="float64",
+                                  chunks=True)
+        for name in STRING_PARAMS:
+            self.f.create_dataset(f"params/{name}", shape=(0,), maxshape=(None,),
+                                  dtype=h5py.string_dtype(), chunks=True)
+        self.count = 0
+
+    def append(self, outputdata, dt, params, source=""):
+        """Adds one B-scan (samples x traces) with its sweep parameters."""
+        if self.f is None:
+            self.open_shard(outputdata.shape, dt)
+        bscans = self.f["bscans"]
+        if outputdata.shape != bscans.shape[1:]:
+            raise ValueError(f"{source}: B-scan shape {outputdata.shape} doesn't match "
+                             f"the store's {bscans.shape[1:]}")
+
+        i = self.count
+        bscans.resize(i + 1, axis=0)
+        bscans[i] = outputdata
+        for name in NUMERIC_PARAMS + STRING_PARAMS:
+            dset = self.f[f"params/{name}"]
+            dset.resize(i + 1, axis=0)
+            value = source if name == "source" else params.get(name)
+            if name in NUMERIC_PARAMS:
+                dset[i] = np.nan if value is None else value
+            else:
+                dset[i] = "" if value is None else str(value)
+        self.count += 1
+        self.total += 1
+
+        if self.shard_size is not None and self.count >= self.shard_size:
+            self.f.close()
+            self.f = None
+            self.shard += 1
+
+    def append_file(self, filename, params=None):
+        """Adds a merged output file; parameters default to those in its name."""
+        outputdata, dt = read_bscan(filename, self.rxcomponent, self.rxnumber)
+        if params is None:
+            params = parse_sweep_name(filename) or {}
+        self.append(outputdata, dt, params, source=os.path.basename(filename))
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Collects merged B-scans into one consolidated HDF5 dataset.',
+                                     usage='python dataset_store.py output.h5 merged_dir [merged_dir ...]')
+    parser.add_argument('output', help='dataset file to write')
+    parser.add_argument('inputs', nargs='*', help='merged output files or folders of them')
+    parser.add_argument('--manifest', default=None,
+                        help='sweep manifest; supplies the parameters, and the files when no inputs are given')
+    parser.add_argument('--component', default='Ez', help='receiver output to store',
+                        choices=['Ex', 'Ey', 'Ez', 'Hx', 'Hy', 'Hz', 'Ix', 'Iy', 'Iz'])
+    parser.add_argument('--rx', type=int, default=1, help='receiver number to store')
+    parser.add_argument('--dtype', default='float32', choices=['float16', 'float32', 'float64'])
+    parser.add_argument('--shard-size', type=int, default=None, help='entries per shard file')
+    parser.add_argument('--append', action='store_true', help='add to an existing dataset')
+    args = parser.parse_args()
+
+    manifest = SweepManifest(args.manifest) if args.manifest else None
+    filenames = []
+    for path in args.inputs:
+        if os.path.isdir(path):
+            filenames += sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith('_merged.out'))
+        else:
+            filenames.append(path)
+    if not args.inputs and manifest is not None:
+        filenames = manifest.merged_files()
+
+    with BscanDatasetWriter(args.output, args.component, args.rx, args.dtype,
+                            shard_size=args.shard_size, mode='a' if args.append else 'w') as writer:
+        for i, filename in enumerate(filenames):
+            try:
+                writer.append_file(filename, manifest.params(filename) if manifest else None)
+            except (OSError, KeyError, ValueError) as e:
+                print(f"Skipping {filename}: {e}")
+                continue
+            if (i + 1) % 100 == 0:
+                print(f"Stored {i + 1}/{len(filenames)}")
+    print(f"Stored {writer.total} B-scans in {args.output}")
@@ -0,0 +1,188 @@
+"""Trims the domain of B-scan models to the region the recording can see.
+
+A reflection only reaches the receiver within the time window if it comes from
+no further than v * time_window / 2 from the antenna, v being the velocity of
+the background material around the source. Everything beyond that distance
+from the antenna path is wasted compute. trim_model() shrinks #domain to the
+antenna path plus that reach (plus the PML), shifts every coordinate if the
+lower edge moves, clips #box to the new domain and leaves the rest of the
+geometry as it is (gprMax clips cylinders and spheres to the grid itself).
+"""
+
+import os
+import math
+import argparse
+
+from in_parser import (C0, parse_commands, get_command, grid_cells, time_step, max_traces,
+                       SOURCE_COMMANDS)
+
+# Argument positions of the x y z coordinates of each command
+COORDINATES = {
+    "#rx": [0],
+    "#box": [0, 3],
+    "#cylinder": [0, 3],
+    "#sphere": [0],
+    "#plate": [0, 3],
+    "#edge": [0, 3],
+    "#triangle": [0, 3, 6],
+    "#geometry_view": [0, 3],
+    "#snapshot": [0, 3],
+}
+for _cmd in SOURCE_COMMANDS:
+    COORDINATES[_cmd] = [1]
+
+
+def fmt(value):
+    """Number for an .in file, without float noise (e.g. 13.065000000000001 -> 13.065)."""
+    text = f"{value:.6f}".rstrip("0").rstrip(".")
+    return "0" if text in ("", "-0") else text
+
+
+def background_permittivity(commands, position):
+    """Relative permittivity of the last #box containing position (1 = free space)."""
+    materials = {args[4]: float(args[0]) for cmd, args in commands if cmd == "#material"}
+    eps = 1.0
+    for cmd, args in commands:
+        if cmd != "#box":
+            continue
+        lower, upper = [float(v) for v in args[0:3]], [float(v) for v in args[3:6]]
+        if all(lower[i] <= position[i] <= upper[i] for i in range(3)):
+            eps = materials.get(args[6], eps)
+    return eps
+
+
+def time_window(commands):
+    """Time window in seconds (converted when given as iterations)."""
+    window = get_command(commands, "#time_window")[0]
+    if "." in window or "e" in window.lower():
+        return float(window)
+    return (int(window) - 1) * time_step(commands)
+
+
+def antenna_path(commands, n):
+    """(lower xyz, upper xyz) spanned by the stepped sources and receivers over n traces."""
+    src_steps = [float(v) for v in get_command(commands, "#src_steps", ["0", "0", "0"])]
+    rx_steps = [float(v) for v in get_command(commands, "#rx_steps", ["0", "0", "0"])]
+    points = []
+    for cmd, args in commands:
+        if cmd in SOURCE_COMMANDS:
+            position, step = [float(v) for v in args[1:4]], src_steps
+        elif cmd == "#rx":
+            position, step = [float(v) for v in args[0:3]], rx_steps
+        else:
+            continue
+        points.append(position)
+        points.append([position[i] + (n - 1) * step[i] for i in range(3)])
+    lower = [min(p[i] for p in points) for i in range(3)]
+    upper = [max(p[i] for p in points) for i in range(3)]
+    return lower, upper
+
+
+def trimmed_domain(commands, n=None, margin=0.0):
+    """(shift xyz, new size xyz, reach) of the smallest domain that still holds
+    every reflection the receivers can record."""
+    if n is None:
+        n = max_traces(commands) or 1
+    size = [float(v) for v in get_command(commands, "#domain")[:3]]
+    d = [float(v) for v in get_command(commands, "#dx_dy_dz")[:3]]
+    pml = get_command(commands, "#pml_cells", ["10"])
+    if len(pml) == 1:
+        pml = pml * 6
+    pml = [int(v) for v in pml]
+    cells = grid_cells(commands)
+
+    lower, upper = antenna_path(commands, n)
+    source = next([float(v) for v in args[1:4]] for cmd, args in commands if cmd in SOURCE_COMMANDS)
+    velocity = C0 / math.sqrt(background_permittivity(commands, source))
+    reach = velocity * time_window(commands) / 2 + margin
+
+    shift, new_size = [0.0] * 3, list(size)
+    for i in range(3):
+        if cells[i] == 1:
+            continue  # 2D direction, nothing to trim
+        # Snap outwards to whole cells so the grid lines stay where they were
+        low = math.floor((lower[i] - reach) / d[i]) - pml[i]
+        high = math.ceil((upper[i] + reach) / d[i]) + pml[i + 3]
+        low = max(0, low)
+        high = min(cells[i], high)
+        shift[i] = low * d[i]
+        new_size[i] = (high - low) * d[i]
+    return shift, new_size, reach
+
+
+def trim_model(lines, n=None, margin=0.0):
+    """Rewrites the lines of an .in file for the trimmed domain.
+
+    Returns (new lines, report) where report holds the cell counts before and after.
+    """
+    commands = parse_commands(lines)
+    shift, size, reach = trimmed_domain(commands, n, margin)
+    before = grid_cells(commands)
+
+    out = []
+    for line in lines:
+        cmd, args = (parse_commands([line]) or [(None, None)])[0]
+        if cmd == "#domain":
+            args = [fmt(v) for v in size] + args[3:]
+        elif cmd in COORDINATES:
+            args = list(args)
+            for start in COORDINATES[cmd]:
+                for i in range(3):
+                    value = float(args[start + i]) - shift[i]
+                    if cmd == "#box":
+                        value = min(max(value, 0.0), size[i])
+                    if abs(value - float(args[start + i])) > 1e-12:
+                        args[start + i] = fmt(value)
+        else:
+            out.append(line)
+            continue
+        newline = "\n" if line.endswith("\n") else ""
+        out.append(f"{cmd}: {' '.join(args)}{newline}")
+
+    after = grid_cells(parse_commands(out))
+    cells_before = before[0] * before[1] * before[2]
+    cells_after = after[0] * after[1] * after[2]
+    report = {"cells_before": cells_before, "cells_after": cells_after, "reach": reach, "shift": shift,
+              "reduction": 1 - cells_after / cells_before}
+    return out, report
+
+
+def trim_file(filepath, n=None, margin=0.0, output=None):
+    """Trims filepath (in place unless output is given) and returns the report."""
+    with open(filepath, "r") as f:
+        lines = f.readlines()
+    lines, report = trim_model(lines, n, margin)
+    with open(output or filepath, "w") as f:
+        f.write("".join(lines))
+    return report
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Shrinks the domain of B-scan models to what the receivers can see.',
+                                     usage='python domain_trim.py models_dir -n 225')
+    parser.add_argument('inputs', nargs='+', help='.in files or folders of them')
+    parser.add_argument('-n', type=int, default=None, help='traces per run (default: as many as fit)')
+    parser.add_argument('--margin', type=float, default=0.0, help='extra distance kept around the reach [m]')
+    parser.add_argument('--out-dir', default=None, help='write trimmed copies here instead of in place')
+    args = parser.parse_args()
+
+    filenames = []
+    for path in args.inputs:
+        if os.path.isdir(path):
+            filenames += sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith('.in'))
+        else:
+            filenames.append(path)
+    if args.out_dir:
+        os.makedirs(args.out_dir, exist_ok=True)
+
+    total_before = total_after = 0
+    for filename in filenames:
+        output = os.path.join(args.out_dir, os.path.basename(filename)) if args.out_dir else None
+        report = trim_file(filename, args.n, args.margin, output)
+        total_before += report["cells_before"]
+        total_after += report["cells_after"]
+        print(f"{os.path.basename(filename)}: {report['cells_before']:,} -> {report['cells_after']:,} cells "
+              f"(-{report['reduction']:.0%}, reach {report['reach']:.2f} m)")
+    if total_before:
+        print(f"Total: {total_before:,} -> {total_after:,} cells (-{1 - total_after / total_before:.0%})")
@@ -1,5 +1,8 @@
 import os
 
+from in_template import InTemplate
+from sweep_manifest import SweepManifest, MANIFEST_NAME
+
 # Define your simulation parameters
 materials = [
     {"first": 1, "second": 0, "third": 1, "fourth": 0, "name": "air"},
@@ -71,28 +74,37 @@ def material_loop():
             f.write(f"box: 0 1 0 0.5 0 0.01 {mat['name']}\n\n")
             f.write("#cylinder: 0.4 0.3 0.0  0.4 0.3 0.002 0.2 pec")
 
+RADII_TEMPLATE = InTemplate("""\
+#title: GPR simulation for cylinder {radius}
+#domain: 15 11 0.002
+#dx_dy_dz: 0.0075 0.0075 0.002
+#time_window: 10e-9
+
+#pml_cells: 0 0 0 0 0 0
+
+material: 6 0 1 0 half_space
+
+#waveform: ricker 1 1.5e9 my_ricker
+
+#hertzian_dipole: z 0.5 0.170 0 my_ricker
+#rx: 0.540 0.170 0
+#src_steps: 0.02 0 0
+#rx_steps: 0.02 0 0
+box: 0 1 0 0.5 0 0.01 half_space
+
+#cylinder: 1.020 0.5 0.0  1.020 0.5 0.002 {radius} pec""")
+
 def radii_loop():
 # Create simulation directory
     if not os.path.exists("simulations_radii"):
         os.mkdir("simulations_radii")
 
-    # Loop over materials and generate input files
-    for rad in radii:
-        filename = f"simulations_radii/cylinder_{rad['radius']}.in"
-        with open(filename, "w") as f:
-            f.write(f"#title: GPR simulation for cylinder {rad['radius']}\n")
-            f.write("#domain: 15 11 0.002\n")
-            f.write("#dx_dy_dz: 0.0075 0.0075 0.002\n")
-            f.write("#time_window: 10e-9\n\n")
-            f.write("#pml_cells: 0 0 0 0 0 0\n\n")
-            f.write(f"material: 6 0 1 0 half_space\n\n")
-            f.write("#waveform: ricker 1 1.5e9 my_ricker\n\n")  
-            f.write("#hertzian_dipole: z 0.5 0.170 0 my_ricker\n")
-            f.write("#rx: 0.540 0.170 0\n")
-            f.write("#src_steps: 0.02 0 0\n")
-            f.write("#rx_steps: 0.02 0 0\n")
-            f.write(f"box: 0 1 0 0.5 0 0.01 half_space\n\n")
-            f.write(f"#cylinder: 1.020 0.5 0.0  1.020 0.5 0.002 {rad['radius']} pec")
+    # Loop over radii and generate input files
+    with SweepManifest(os.path.join("simulations_radii", MANIFEST_NAME)) as manifest:
+        for rad in radii:
+            filename = f"simulations_radii/cylinder_{rad['radius']}.in"
+            RADII_TEMPLATE.write(filename, rad)
+            manifest.add(filename, rad)
 
 if __name__ == "__main__":
     radii_loop()
@@ -1,5 +1,12 @@
 import os
 import math
+import argparse
+
+from sweep import product, TimeWindows
+from in_parser import parse_commands, read_commands, model_cost
+from in_template import InTemplate
+from sweep_manifest import SweepManifest, MANIFEST_NAME
+from domain_trim import trim_file
 
 # Define parameter ranges
 radii = [round(r, 2) for r in [x / 100 for x in range(5, 85, 5)]]  # 5cm to 80cm
@@ -9,11 +16,110 @@ angles = list(range(15, 76, 15))  # 15° to 60°
 materials = ["clay", "wet_concrete", "pec", "pvc", "dry_soil", "moist_soil", "silty_soil", 
                 "loamy_soil", "wet_loam", "peat_soil"]  # order corresponds to splits
 
+# Full campaign: every material x radius x depth x angle, generated lazily
+SWEEP = product(material=materials, radius=radii, depth=depths, angle=angles)
+
+# Size #time_window per model from the deepest point of the pipe instead of
+# using FIXED_TIME_WINDOW for every depth
+AUTO_TIME_WINDOW = True
+FIXED_TIME_WINDOW = 60e-9
+TIME_WINDOWS = TimeWindows(FIXED_TIME_WINDOW, AUTO_TIME_WINDOW)
+
+
 def format_value(val):
     return str(val).replace(".", "_")
 
-def generate_simulation_files():
+
+def pipe_geometry(params):
+    """Pipe end points for a sweep entry (1 m long, tilted by the angle)."""
+    angle_rad = math.radians(params["angle"])
+    x0, y0 = 6.0, params["depth"]
+    pipe_len = 1.0
+    x1 = round(x0 + pipe_len * math.cos(angle_rad), 3)
+    y1 = round(y0 + pipe_len * math.sin(angle_rad), 3)
+    return {"x0": x0, "y0": y0, "x1": x1, "y1": y1}
+
+
+def model_time_window(params):
+    """#time_window for a sweep entry with its pipe geometry."""
+    return TIME_WINDOWS(max(params["y0"], params["y1"]) + params["radius"])
+
+
+def model_name(params):
+    r_str = format_value(params["radius"])
+    d_str = format_value(params["depth"])
+    a_str = str(params["angle"])
+    return f"gpr_{params['material']}_r{r_str}_d{d_str}_a{a_str}_"
+
+
+def iter_models(sweep=SWEEP):
+    """Yields (name, params) for each model on demand, without writing anything."""
+    for params in sweep.map(pipe_geometry).map(model_time_window):
+        yield model_name(params), params
+
+
+# Only the title, time window and cylinder lines change between models
+MODEL_TEMPLATE = InTemplate("""\
+#title: Material={material}, Radius={radius}, Depth={depth}, Angle={angle}
+#domain: 15 11 0.002
+#dx_dy_dz: 0.0075 0.0075 0.002
+#time_window: {time_window}
+
+#pml_cells: 10 5 0 5 5 0
+
+#material: 6 0 1 0 half_space
+#material: 1 0 1 0 air
+#material: 9 0 1 0 wet_concrete
+#material: 30 0 1 0 clay
+#material: 3.8 10e-6 1 0 pvc
+#material: 3.03 0.0003 1 0 dry_soil
+#material: 7.45 0.015 1 0 moist_soil
+#material: 13.28 0.04 1 0 silty_soil
+#material: 10.12 0.03 1 0 loamy_soil
+#material: 25.2 0.08 1 0 wet_loam
+#material: 70 0.15 1 0 peat_soil
+#waveform: ricker 1 500e6 my_ricker
+#hertzian_dipole: z 0.2 0.170 0 my_ricker
+#rx: 0.40 0.170 0
+#src_steps: 0.04 0 0
+#rx_steps: 0.04 0 0
+#box: 0 0 0 15 10 0.002 half_space
+
+#cylinder: {x0} {y0} 0 {x1} {y1} 0.002 {radius} {material}
+#output_dir: C:/Users/user/gprMax/batch_sim/outputs_simulations_full
+""")
+
+
+def write_model(filename, params):
+    MODEL_TEMPLATE.write(filename, params)
+
+
+def estimated_cost(params):
+    """Relative compute of a model (domain cells x iterations x traces), from its .in text."""
+    params = dict(params, **pipe_geometry(params))
+    params.update(model_time_window(params))
+    return model_cost(parse_commands(MODEL_TEMPLATE.render(params).splitlines()))
+
+
+def select_shard(sweep, index, count, balance="cost"):
+    """Models of shard index out of count.
+
+    balance="cost" gives every shard about the same estimated compute;
+    balance="index" simply takes every count-th model.
+    """
+    if balance == "cost":
+        return sweep.balanced_shard(index, count, estimated_cost)
+    return sweep.shard(index, count)
+
+
+def generate_simulation_files(shard=None, balance="cost", trim_traces=None):
     base_dir = "simulations_full_strategy_split"
+    sweep = SWEEP
+    if shard is not None:
+        # Each node writes its own folder, e.g. simulations_full_strategy_split/shard_3_of_8
+        index, count = shard
+        sweep = select_shard(SWEEP, index, count, balance)
+        base_dir = os.path.join(base_dir, f"shard_{index}_of_{count}")
     os.makedirs(base_dir, exist_ok=True)
 
     # Create split directories, one per material
@@ -23,55 +129,49 @@ def generate_simulation_files():
         os.makedirs(split_path, exist_ok=True)
         split_dirs[material] = split_path  # map material to its split folder
 
+    # Parameter -> file index, so later steps don't have to parse the file names
     count = 0
-    for material in materials:
-        folder = split_dirs[material]  # folder for this material (split)
-
-        for radius in radii:
-            for depth in depths:
-                for angle in angles:
-                    angle_rad = math.radians(angle)
-                    x0, y0 = 6.0, depth
-                    pipe_len = 1.0
-                    x1 = round(x0 + pipe_len * math.cos(angle_rad), 3)
-                    y1 = round(y0 + pipe_len * math.sin(angle_rad), 3)
-
-                    r_str = format_value(radius)
-                    d_str = format_value(depth)
-                    a_str = str(angle)
-
-                    filename = os.path.join(folder, f"gpr_{material}_r{r_str}_d{d_str}_a{a_str}_.in")
-
-                    with open(filename, "w") as f:
-                        f.write(f"#title: Material={material}, Radius={radius}, Depth={depth}, Angle={angle}\n")
-                        f.write("#domain: 15 11 0.002\n")
-                        f.write("#dx_dy_dz: 0.0075 0.0075 0.002\n")
-                        f.write("#time_window: 60e-9\n\n")
-                        f.write("#pml_cells: 10 5 0 5 5 0\n\n")
-                        f.write("#material: 6 0 1 0 half_space\n")
-                        f.write("#material: 1 0 1 0 air\n")
-                        f.write("#material: 9 0 1 0 wet_concrete\n")
-                        f.write("#material: 30 0 1 0 clay\n")
-                        f.write("#material: 3.8 10e-6 1 0 pvc\n")
-                        f.write("#material: 3.03 0.0003 1 0 dry_soil\n")
-                        f.write("#material: 7.45 0.015 1 0 moist_soil\n")
-                        f.write("#material: 13.28 0.04 1 0 silty_soil\n")
-                        f.write("#material: 10.12 0.03 1 0 loamy_soil\n")
-                        f.write("#material: 25.2 0.08 1 0 wet_loam\n")
-                        f.write("#material: 70 0.15 1 0 peat_soil\n")
-
-                        f.write("#waveform: ricker 1 500e6 my_ricker\n")
-                        f.write("#hertzian_dipole: z 0.2 0.170 0 my_ricker\n")
-                        f.write("#rx: 0.40 0.170 0\n")
-                        f.write("#src_steps: 0.04 0 0\n")
-                        f.write("#rx_steps: 0.04 0 0\n")
-                        f.write("#box: 0 0 0 15 10 0.002 half_space\n\n")
-                        f.write(f"#cylinder: {x0} {y0} 0 {x1} {y1} 0.002 {radius} {material}\n")
-                        f.write("#output_dir: C:/Users/user/gprMax/batch_sim/outputs_simulations_full\n")
-
-                    count += 1
+    cells_before = cells_after = 0
+    with SweepManifest(os.path.join(base_dir, MANIFEST_NAME)) as manifest:
+        for name, params in iter_models(sweep):
+            folder = split_dirs[params["material"]]  # folder for this material (split)
+            filename = os.path.join(folder, f"{name}.in")
+            write_model(filename, params)
+            if trim_traces:
+                # Shrink the domain to what trim_traces traces can record
+                report = trim_file(filename, n=trim_traces)
+                cells_before += report["cells_before"]
+                cells_after += report["cells_after"]
+            TIME_WINDOWS.tally(read_commands(filename), cap=trim_traces)
+            manifest.add(filename, params)
+            count += 1
 
     print(f"Generated {count} files across {len(materials)} folders in '{base_dir}'")
+    if AUTO_TIME_WINDOW:
+        print(TIME_WINDOWS.report())
+    if cells_before:
+        print(f"Trimmed domains: {cells_before:,} -> {cells_after:,} cells "
+              f"(-{1 - cells_after / cells_before:.0%})")
+
+
+def parse_shard(text):
+    """'i/N' -> (i, N), with shards numbered 0 to N-1."""
+    index, count = (int(v) for v in text.split("/"))
+    if not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"shard {text}: index must be between 0 and {count - 1}")
+    return index, count
+
 
 if __name__ == "__main__":
-    generate_simulation_files()
+
+    parser = argparse.ArgumentParser(description='Generates the material/radius/depth/angle sweep.',
+                                     usage='python generate5d.py --shard 0/8')
+    parser.add_argument('--shard', type=parse_shard, default=None,
+                        help='only write shard i of N (i/N, numbered from 0), e.g. one per cluster node')
+    parser.add_argument('--balance', default='cost', choices=['cost', 'index'],
+                        help='split shards by estimated compute (cells x iterations x traces) or by model index')
+    parser.add_argument('--trim', type=int, default=None, metavar='N',
+                        help='shrink each domain to what a run with -n N traces can record')
+    args = parser.parse_args()
+
+    generate_simulation_files(args.shard, args.balance, args.trim)
@@ -1,5 +1,10 @@
 import os
 
+from sweep import product, TimeWindows
+from in_parser import read_commands
+from in_template import InTemplate
+from sweep_manifest import SweepManifest, MANIFEST_NAME
+
 radii = [
     {"radius": 0.050}, {"radius": 0.100}, {"radius": 0.150}, {"radius": 0.200},
     {"radius": 0.250}, {"radius": 0.300}, {"radius": 0.350}, {"radius": 0.400},
@@ -14,38 +19,73 @@ depths = [
     {"depth": 1.850}, {"depth": 1.900}, {"depth": 1.950}, {"depth": 2.000}
 ]
 
+# Every radius at every depth, generated lazily
+SWEEP = product(radius=[r["radius"] for r in radii], depth=[d["depth"] for d in depths])
+
+# Size #time_window per model from the bottom of the cylinder instead of using
+# FIXED_TIME_WINDOW for every depth
+AUTO_TIME_WINDOW = True
+FIXED_TIME_WINDOW = 50e-9
+TIME_WINDOWS = TimeWindows(FIXED_TIME_WINDOW, AUTO_TIME_WINDOW)
+
+
 def format_value(val):
     """Converts 0.05 -> '005', 1.250 -> '1250' etc. Safe for filenames."""
     return str(val).replace(".", "_")
 
+def model_time_window(params):
+    return TIME_WINDOWS(params["depth"] + params["radius"])
+
+
+def iter_models(sweep=SWEEP):
+    """Yields (name, params) for each model on demand."""
+    for params in sweep.map(model_time_window):
+        r_str = format_value(params['radius'])   # e.g., 0.05 -> '0_05'
+        d_str = format_value(params['depth'])    # e.g., 1.25 -> '1_25'
+        yield f"cylinder_r{r_str}d{d_str}_", params
+
+
+MODEL_TEMPLATE = InTemplate("""\
+#title: GPR simulation for cylinder r={radius} d={depth}
+#domain: 15 11 0.002
+#dx_dy_dz: 0.0075 0.0075 0.002
+#time_window: {time_window}
+
+#pml_cells: 10 5 0 5 5 0
+
+#material: 6 0 1 0 half_space
+
+#material: 3.4 1e-5 1 0 pvc
+
+#waveform: ricker 1 500e6 my_ricker
+
+#hertzian_dipole: z 0.2 0.170 0 my_ricker
+#rx: 0.40 0.170 0
+#src_steps: 0.04 0 0
+#rx_steps: 0.04 0 0
+#box: 0 0 0 15 10 0.002 half_space
+
+#cylinder: 6 {depth} 0 6 {depth} 0.002 {radius} pvc""")
+
+
+def write_model(filename, params):
+    MODEL_TEMPLATE.write(filename, params)
+
+
 def radii_depth_loop():
     base_dir = "simulations_radii_depth_pvc"
     os.makedirs(base_dir, exist_ok=True)
 
-    for rad in radii:
-        for dep in depths:
-            r_str = format_value(rad['radius'])   # e.g., 0.05 -> '0_05'
-            d_str = format_value(dep['depth'])    # e.g., 1.25 -> '1_25'
-            filename = f"{base_dir}/cylinder_r{r_str}d{d_str}_.in"
-
-
-            with open(filename, "w") as f:
-                f.write(f"#title: GPR simulation for cylinder r={rad['radius']} d={dep['depth']}\n")
-                f.write("#domain: 15 11 0.002\n")
-                f.write("#dx_dy_dz: 0.0075 0.0075 0.002\n")
-                f.write("#time_window: 50e-9\n\n")
-                f.write("#pml_cells: 10 5 0 5 5 0\n\n")
-                f.write("#material: 6 0 1 0 half_space\n\n")
-                f.write("#material: 3.4 1e-5 1 0 pvc\n\n")
-                f.write("#waveform: ricker 1 500e6 my_ricker\n\n")
-                f.write("#hertzian_dipole: z 0.2 0.170 0 my_ricker\n")
-                f.write("#rx: 0.40 0.170 0\n")
-                f.write("#src_steps: 0.04 0 0\n")
-                f.write("#rx_steps: 0.04 0 0\n")
-                f.write("#box: 0 0 0 15 10 0.002 half_space\n\n")
-                f.write(f"#cylinder: 6 {dep['depth']} 0 6 {dep['depth']} 0.002 {rad['radius']} pvc")
-
-    print(f"Generated {len(radii) * len(depths)} simulation files in '{base_dir}'")
+    with SweepManifest(os.path.join(base_dir, MANIFEST_NAME)) as manifest:
+        for name, params in iter_models():
+            filename = f"{base_dir}/{name}.in"
+            write_model(filename, params)
+            manifest.add(filename, params)
+            TIME_WINDOWS.tally(read_commands(filename))
+
+    print(f"Generated {len(SWEEP)} simulation files in '{base_dir}'")
+    if AUTO_TIME_WINDOW:
+        print(TIME_WINDOWS.report())
 
 if __name__ == "__main__":
     radii_depth_loop()
\ No newline at end of file
@@ -1,5 +1,7 @@
 import os
 
+from sweep import product
+from sweep_manifest import SweepManifest, MANIFEST_NAME
 
 materials = [
     {"first": 1, "second": 0, "third": 1, "fourth": 0, "name": "air"},
@@ -37,34 +39,47 @@ materials = [
 # Radii from 0.01 to 0.5 (inclusive) with 0.01 steps
 radii = [round(r, 3) for r in [i * 0.01 for i in range(1, 51)]]
 
+# Every material with every radius, generated lazily
+SWEEP = product(mat=materials, radius=radii)
+
 # Output folder
 output_dir = "simulations_material_radii"
 os.makedirs(output_dir, exist_ok=True)
 
-def generate_inputs():
-    for mat in materials:
-        for radius in radii:
-            filename = f"{mat['name']}_{radius:.3f}.in"
-            filepath = os.path.join(output_dir, filename)
+def iter_models(sweep=SWEEP):
+    """Yields (name, params) for each model on demand."""
+    for params in sweep:
+        yield f"{params['mat']['name']}_{params['radius']:.3f}", params
+
 
-            with open(filepath, "w") as f:
-                f.write(f"#title: GPR simulation for {mat['name']} with radius {radius}\n")
-                f.write("#domain: 1.0 0.5 0.01\n")
-                f.write("#dx_dy_dz: 0.01 0.01 0.01\n")
-                f.write("#time_window: 20e-9\n\n")
-                f.write("#waveform: ricker 1 1.0e9 my_ricker\n\n")
-                f.write("#hertzian_dipole: z 0.18 0.4 0 my_ricker\n")
-                f.write("#rx: 0.2 0.4 0\n")
+def write_model(filepath, params):
+    mat, radius = params["mat"], params["radius"]
+    with open(filepath, "w") as f:
+        f.write(f"#title: GPR simulation for {mat['name']} with radius {radius}\n")
+        f.write("#domain: 1.0 0.5 0.01\n")
+        f.write("#dx_dy_dz: 0.01 0.01 0.01\n")
+        f.write("#time_window: 20e-9\n\n")
+        f.write("#waveform: ricker 1 1.0e9 my_ricker\n\n")
+        f.write("#hertzian_dipole: z 0.18 0.4 0 my_ricker\n")
+        f.write("#rx: 0.2 0.4 0\n")
 
-                # Half-space as background material
-                f.write("material: 6 0 1 0 half_space\n")
-                f.write(f"box: 0 1 0 0.5 0 0.01 half_space\n\n")
+        # Half-space as background material
+        f.write("material: 6 0 1 0 half_space\n")
+        f.write(f"box: 0 1 0 0.5 0 0.01 half_space\n\n")
 
-                # Cylinder of specified material and radius
-                f.write(f"material: {mat['first']} {mat['second']} {mat['third']} {mat['fourth']} {mat['name']}\n")
-                f.write(f"cylinder: 0.4 0.3 0.0  0.4 0.3 0.002 {radius} {mat['name']}\n")
+        # Cylinder of specified material and radius
+        f.write(f"material: {mat['first']} {mat['second']} {mat['third']} {mat['fourth']} {mat['name']}\n")
+        f.write(f"cylinder: 0.4 0.3 0.0  0.4 0.3 0.002 {radius} {mat['name']}\n")
+
+
+def generate_inputs():
+    with SweepManifest(os.path.join(output_dir, MANIFEST_NAME)) as manifest:
+        for name, params in iter_models():
+            filename = os.path.join(output_dir, f"{name}.in")
+            write_model(filename, params)
+            manifest.add(filename, {"material": params["mat"]["name"], "radius": params["radius"]})
 
-    print(f"Generated {len(materials) * len(radii)} simulation files in '{output_dir}'")
+    print(f"Generated {len(SWEEP)} simulation files in '{output_dir}'")
 
 if __name__ == "__main__":
     generate_inputs()
@@ -7,13 +7,15 @@ import h5py
 import shutil
 import time 
 import webbrowser 
+from collections import deque, OrderedDict
 from de.runl import GPRMaxInputGenerator
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QFileDialog, QMessageBox,
     QPlainTextEdit, QTabWidget, QAction, QInputDialog, QVBoxLayout, QWidget,
     QToolBar, QSplitter, QFileSystemModel, QTreeView, QLineEdit, QLabel, QHBoxLayout,
     QDialog, QDialogButtonBox, QFormLayout, QComboBox, QPushButton, QCheckBox, QMenu, QAbstractItemView,
-    QTableWidget, QTableWidgetItem, QListWidget, QSlider, QToolTip, QTextEdit, QCompleter, QWidget
+    QTableWidget, QTableWidgetItem, QListWidget, QSlider, QToolTip, QTextEdit, QCompleter, QWidget,
+    QListWidgetItem, QSpinBox, QDockWidget, QHeaderView, QProgressBar
 )
 from PyQt5.QtGui import (QFont, QPixmap, QIcon, QTextCharFormat, QColor, QSyntaxHighlighter, QTextCursor,QKeySequence 
                         ,QPainter, QTextFormat, QCursor
@@ -22,10 +24,294 @@ from PyQt5.QtCore import Qt, QDir, QObject, pyqtSignal, QTimer, QStringListModel
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 import numpy as np
+from batch_ledger import JobLedger, file_hash
+from merge_engine import merge_files
+from result_cache import ResultCache, cache_key, store_run, fetch_run
+
+try:
+    import psutil
+except ImportError:
+    psutil = None  # run manager then shows no CPU/memory figures
+
+# Merged results shared between batches, keyed by normalised .in content + arguments
+RESULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".gprstudio", "result_cache")
+RESULT_CACHE_MAX_GB = 50
+
+# Shell pane: lines are collected off the GUI thread and appended in one go
+# every SHELL_FLUSH_MS; the pane keeps only the last SHELL_MAX_LINES lines
+SHELL_FLUSH_MS = 100
+SHELL_MAX_LINES = 5000
+
+# Output data viewer: traces kept in memory and output files kept open (most recently used)
+TRACE_CACHE_SIZE = 64
+OUTPUT_FILE_CACHE_SIZE = 16
+
+# A running gprMax run that has reported no progress for this long is flagged as stalled
+STALL_SECONDS = 120
+
+# Run manager: finished runs (and their output) kept beyond this are dropped, oldest first
+MAX_FINISHED_RUNS = 50
+
+# gprMax progress output: "--- Model 3/225, input file: ..." and the tqdm bar
+# "Running simulation, model 3/225: 45%|####  | 1234/2742 [00:05<00:06, 245.30it/s]"
+MODEL_PROGRESS = re.compile(r"model (\d+)/(\d+)", re.IGNORECASE)
+ITERATION_PROGRESS = re.compile(r"(\d+)/(\d+) \[[^\]]*?(?:([\d.]+)(it/s|s/it))?\]")
+
+class RunRecord:
+    """A process (or in-process task such as a merge) started from gprStudio."""
+
+    def __init__(self, run_id, command, kind, process=None, log_path=None):
+        self.id = run_id
+        self.command = command
+        self.kind = kind
+        self.runner = None          # CommandRunner that owns the process, if any
+        self._process = process
+        self.log_path = log_path    # output captured in a file instead of a pipe
+        self.log_offset = 0
+        self.buffer = OutputBuffer()
+        self.progress = RunProgress()
+        self.status = "running"
+        self.returncode = None
+        self.started = time.time()
+        self.finished = None
+        self.procs = {}             # pid -> psutil.Process of the run and its children
+
+    @property
+    def process(self):
+        if self.runner is not None:
+            return getattr(self.runner, "process", None)
+        return self._process
+
+    @property
+    def pid(self):
+        return self.process.pid if self.process is not None else None
+
+    def elapsed(self):
+        return (self.finished or time.time()) - self.started
+
+    def finish(self, returncode):
+        self.returncode = returncode
+        self.finished = time.time()
+        if self.status == "running":
+            self.status = "done" if returncode == 0 else f"failed ({returncode})"
+
+    def kill(self):
+        process = self.process
+        if process is None or process.poll() is not None:
+            return
+        if psutil is not None:
+            # shell=True runs put gprMax under a shell; take the whole tree down
+            try:
+                for child in psutil.Process(process.pid).children(recursive=True):
+                    child.kill()
+            except psutil.Error:
+                pass
+        process.kill()
+        self.status = "killed"
+
+    def read_log(self):
+        """Moves new lines of the run's log file into its buffer."""
+        if not self.log_path or not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, "r", errors="replace") as f:
+            f.seek(self.log_offset)
+            text = f.read()
+            self.log_offset = f.tell()
+        for line in text.splitlines():
+            event = self.progress.feed(line)
+            if event is None or "iteration" not in event:
+                self.buffer.append(line)
+
+    def usage(self):
+        """(CPU %, resident memory in bytes) of the process and its children, or None."""
+        if psutil is None or self.pid is None or self.finished is not None:
+            return None
+        try:
+            if self.pid not in self.procs:
+                self.procs = {self.pid: psutil.Process(self.pid)}
+            pids = [self.pid] + [child.pid for child in self.procs[self.pid].children(recursive=True)]
+        except psutil.Error:
+            return None
+        # cpu_percent() measures since the previous call on the same object, so
+        # the objects are kept across refreshes (the first call always reads 0)
+        for pid in pids:
+            if pid not in self.procs:
+                try:
+                    self.procs[pid] = psutil.Process(pid)
+                except psutil.Error:
+                    continue
+        self.procs = {pid: proc for pid, proc in self.procs.items() if pid in pids}
+        cpu = memory = 0
+        for proc in self.procs.values():
+            try:
+                cpu += proc.cpu_percent(interval=None)
+                memory += proc.memory_info().rss
+            except psutil.Error:
+                continue
+        return cpu, memory
+
+
+class RunManagerDock(QDockWidget):
+    """Lists every run started from gprStudio with its PID, elapsed time,
+    CPU/memory use and status, and can kill it. Selecting a row shows that
+    run's output in the shell pane.
+
+    Only the last MAX_FINISHED_RUNS finished runs are kept; "Clear finished"
+    drops them all. Rows of finished runs are filled in once, not on every
+    refresh."""
+
+    run_selected = pyqtSignal(int)
+
+    COLUMNS = ["ID", "Command", "PID", "Elapsed", "Progress", "CPU", "Memory", "Status", ""]
+
+    def __init__(self, parent=None):
+        super().__init__("Runs", parent)
+        self.runs = {}
+        self.rows = {}
+        self.final = set()     # finished runs whose row is already up to date
+        self.removed_lines = 0  # output lines of runs dropped from the list
+        self.next_id = 1
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
+        self.table.itemSelectionChanged.connect(self.selection_changed)
+
+        clear_btn = QPushButton("Clear finished")
+        clear_btn.clicked.connect(lambda: self.remove_finished(0))
+        buttons = QHBoxLayout()
+        buttons.addStretch()
+        buttons.addWidget(clear_btn)
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.table)
+        layout.addLayout(buttons)
+        container = QWidget()
+        container.setLayout(layout)
+        self.setWidget(container)
+
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.refresh_timer.start(1000)
+
+    def register(self, command, kind, process=None, log_path=None):
+        record = RunRecord(self.next_id, command, kind, process, log_path)
+        self.next_id += 1
+        self.runs[record.id] = record
+
+        row = self.table.rowCount()
+        self.table.insertRow(row)
+        self.rows[record.id] = row
+        self.table.setItem(row, 0, QTableWidgetItem(str(record.id)))
+        self.table.setItem(row, 1, QTableWidgetItem(f"[{kind}] {command}"))
+        for column in range(2, 8):
+            self.table.setItem(row, column, QTableWidgetItem(""))
+        progress_bar = QProgressBar()
+        progress_bar.setRange(0, 1000)
+        progress_bar.setTextVisible(True)
+        progress_bar.setFormat("")
+        self.table.setCellWidget(row, 4, progress_bar)
+        kill_btn = QPushButton("Kill")
+        kill_btn.clicked.connect(lambda _, run_id=record.id: self.kill_run(run_id))
+        self.table.setCellWidget(row, 8, kill_btn)
+        self.refresh()
+        return record
+
+    def kill_run(self, run_id):
+        self.runs[run_id].kill()
+        self.refresh()
+
+    def select(self, run_id):
+        self.table.selectRow(self.rows[run_id])
+
+    def selection_changed(self):
+        rows = self.table.selectionModel().selectedRows()
+        if rows:
+            self.run_selected.emit(int(self.table.item(rows[0].row(), 0).text()))
+
+    def remove_finished(self, keep=MAX_FINISHED_RUNS):
+        """Drops all but the keep most recent finished runs and their rows."""
+        finished = [run_id for run_id, record in self.runs.items() if record.finished is not None]
+        dropped = finished[:max(0, len(finished) - keep)]
+        if not dropped:
+            return
+        for row in sorted((self.rows[run_id] for run_id in dropped), reverse=True):
+            self.table.removeRow(row)
+        for run_id in dropped:
+            self.removed_lines += self.runs.pop(run_id).buffer.lines
+            self.final.discard(run_id)
+        self.rows = {int(self.table.item(row, 0).text()): row for row in range(self.table.rowCount())}
+
+    def refresh(self):
+        finished = False
+        for run_id, record in self.runs.items():
+            if run_id in self.final:
+                continue
+            row = self.rows[run_id]
+            if record.finished is None:
+                if record._process is not None:
+                    # Processes not owned by a CommandRunner are polled here
+                    returncode = record._process.poll()
+                    if returncode is not None:
+                        record.finish(returncode)
+                # Tails the log while running, with one last read on the tick it finishes
+                record.read_log()
+
+            usage = record.usage()
+            self.table.item(row, 2).setText(str(record.pid) if record.pid is not None else "-")
+            self.table.item(row, 3).setText(time.strftime('%H:%M:%S', time.gmtime(record.elapsed())))
+            self.update_progress(row, record)
+            self.table.item(row, 5).setText(f"{usage[0]:.0f}%" if usage else "")
+            self.table.item(row, 6).setText(f"{usage[1] / 1024 ** 2:.0f} MB" if usage else "")
+            stalled = record.status == "running" and record.progress.stalled()
+            self.table.item(row, 7).setText("stalled" if stalled else record.status)
+            self.table.item(row, 7).setForeground(QColor("red" if stalled else "black"))
+            self.table.cellWidget(row, 8).setEnabled(record.status == "running" and record.process is not None)
+            if record.finished is not None:
+                self.final.add(run_id)
+                finished = True
+        if finished:
+            self.remove_finished()
+
+    def update_progress(self, row, record):
+        progress = record.progress
+        bar = self.table.cellWidget(row, 4)
+        if not progress.started:
+            return
+        bar.setValue(int(progress.fraction() * 1000) if record.status == "running" or record.returncode else 1000)
+        bar.setFormat(f"{progress.model}/{progress.models}" if progress.models else f"{progress.model}")
+        bar.setToolTip(progress.summary())
+
+
+class BatchJob:
+    """One queued gprMax run (or a model reusing another run's result)."""
+
+    def __init__(self, file_path, item):
+        self.file_path = file_path
+        self.item = item
+        self.status = "queued"
+        self.process = None
+        self.key = None
+        self.ckey = None
+        self.started = None
+        self.finished = None
+        self.duplicates = []
+        self.run = None  # RunRecord in the run manager
+
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
 
 class BatchRunDialog(QDialog):
-    def __init__(self):
+    def __init__(self, run_manager=None):
         super().__init__()
+        self.run_manager = run_manager
         self.setWindowTitle("Batch Simulation Runner")
         self.setMinimumSize(600, 400)
 
@@ -34,19 +320,35 @@ class BatchRunDialog(QDialog):
         add_btn = QPushButton("Add .in Files")
         add_btn.clicked.connect(self.add_files)
 
-        clear_btn = QPushButton("Clear")
-        clear_btn.clicked.connect(self.file_list.clear)
+        self.clear_btn = QPushButton("Clear")
+        self.clear_btn.clicked.connect(self.file_list.clear)
 
         self.n_input = QLineEdit("1")
         self.gpu_check = QCheckBox("Use GPU")
         self.mpi_check = QCheckBox("Enable MPI")
         self.mpi_input = QLineEdit("")
         self.no_spawn_check = QCheckBox("--mpi-no-spawn")
+        self.cache_check = QCheckBox("Reuse cached results for identical models")
+        self.cache_check.setChecked(True)
+
+        self.concurrency_input = QSpinBox()
+        self.concurrency_input.setRange(1, 256)
+        self.concurrency_input.setValue(min(4, os.cpu_count() or 1))
 
         self.mpi_check.stateChanged.connect(self.toggle_mpi)
 
-        run_btn = QPushButton("Run All")
-        run_btn.clicked.connect(self.run_all)
+        self.run_btn = QPushButton("Run All")
+        self.run_btn.clicked.connect(self.run_all)
+
+        self.pause_btn = QPushButton("Pause")
+        self.pause_btn.setEnabled(False)
+        self.pause_btn.clicked.connect(self.toggle_pause)
+
+        self.cancel_btn = QPushButton("Cancel")
+        self.cancel_btn.setEnabled(False)
+        self.cancel_btn.clicked.connect(self.cancel_all)
+
+        self.status_label = QLabel("")
 
         layout = QVBoxLayout()
         layout.addWidget(QLabel("Selected .in Files:"))
@@ -54,7 +356,7 @@ class BatchRunDialog(QDialog):
 
         file_controls = QHBoxLayout()
         file_controls.addWidget(add_btn)
-        file_controls.addWidget(clear_btn)
+        file_controls.addWidget(self.clear_btn)
         layout.addLayout(file_controls)
 
         layout.addWidget(QLabel("Number of models (-n):"))
@@ -64,10 +366,67 @@ class BatchRunDialog(QDialog):
         layout.addWidget(QLabel("MPI Processes:"))
         layout.addWidget(self.mpi_input)
         layout.addWidget(self.no_spawn_check)
-        layout.addWidget(run_btn)
+        layout.addWidget(self.cache_check)
+        layout.addWidget(QLabel("Maximum concurrent simulations:"))
+        layout.addWidget(self.concurrency_input)
+
+        run_controls = QHBoxLayout()
+        run_controls.addWidget(self.run_btn)
+        run_controls.addWidget(self.pause_btn)
+        run_controls.addWidget(self.cancel_btn)
+        layout.addLayout(run_controls)
+        layout.addWidget(self.status_label)
 
         self.setLayout(layout)
         self.commands = []
+        self.ledgers = {}
+        self.jobs = []
+        # Guards job.status between the GUI and store_result threads
+        self.status_lock = threading.Lock()
+        self.paused = False
+        self.batch_started = None
+
+        # Polls running processes and starts queued ones without blocking the event loop
+        self.queue_timer = QTimer(self)
+        self.queue_timer.setInterval(500)
+        self.queue_timer.timeout.connect(self.process_queue)
+
+    def ledger_for(self, file_path):
+        # One ledger per input folder, next to the .in files it tracks
+        folder = os.path.dirname(os.path.abspath(file_path))
+        if folder not in self.ledgers:
+            self.ledgers[folder] = JobLedger(os.path.join(folder, "batch_ledger.jsonl"))
+        return self.ledgers[folder]
+
+    def reuse_cached(self, file_path, n, cache, ckey, key=None):
+        merged = fetch_run(cache, ckey, file_path, n)
+        if merged is None:
+            return False
+        self.ledger_for(file_path).record(file_path, "done", key=key, n=n, returncode=0,
+                                          wall_time=0.0, outputs=[merged], cached=True)
+        return True
+
+    def store_result(self, job):
+        # Runs in a worker thread: merging into the cache can take a while
+        try:
+            stored = store_run(self.cache, job.ckey, job.file_path, self.n)
+        except Exception as e:
+            # e.g. disk full; the duplicates are simulated instead
+            print(f"Cache: could not store {job.file_path}: {e}")
+            stored = None
+        for duplicate in job.duplicates:
+            # Cancelled meanwhile: leave it cancelled rather than queue it again
+            if duplicate.status != "waiting":
+                continue
+            try:
+                cached = stored and self.reuse_cached(duplicate.file_path, self.n, self.cache, job.ckey)
+            except Exception as e:
+                print(f"Cache: could not restore {duplicate.file_path}: {e}")
+                cached = False
+            with self.status_lock:
+                if duplicate.status == "waiting":
+                    # No cached result to copy, simulate it after all
+                    duplicate.status = "cached" if cached else "queued"
 
     def toggle_mpi(self):
         enabled = self.mpi_check.isChecked()
@@ -76,38 +435,302 @@ class BatchRunDialog(QDialog):
 
     def add_files(self):
         files, _ = QFileDialog.getOpenFileNames(self, "Select .in Files", "", "Input Files (*.in)")
+        listed = [self.file_list.item(i).data(Qt.UserRole) for i in range(self.file_list.count())]
         for f in files:
-            if f not in [self.file_list.item(i).text() for i in range(self.file_list.count())]:
-                self.file_list.addItem(f)
+            if f not in listed:
+                item = QListWidgetItem(f)
+                item.setData(Qt.UserRole, f)
+                self.file_list.addItem(item)
+
+    def build_command(self, file_path):
+        cmd = ["python", "-m", "gprMax", file_path, "-n", str(self.n)]
+        if self.gpu_check.isChecked():
+            cmd.append("--gpu")
+        mpi_n = self.mpi_input.text().strip()
+        if self.mpi_check.isChecked() and mpi_n.isdigit():
+            cmd += ["-mpi", mpi_n]
+            if self.no_spawn_check.isChecked():
+                cmd.append("--mpi-no-spawn")
+        return cmd
 
     def run_all(self):
-        from subprocess import Popen
-
         if self.file_list.count() == 0:
             QMessageBox.warning(self, "No Files", "Please add at least one .in file.")
             return
 
         n = self.n_input.text().strip()
+        if not n.isdigit():
+            QMessageBox.warning(self, "Invalid Input", "Number of models must be an integer.")
+            return
+        self.n = int(n)
         gpu = self.gpu_check.isChecked()
-        use_mpi = self.mpi_check.isChecked()
-        mpi_n = self.mpi_input.text().strip()
-        no_spawn = self.no_spawn_check.isChecked()
+
+        self.cache = None
+        if self.cache_check.isChecked():
+            self.cache = ResultCache(RESULT_CACHE_DIR, int(RESULT_CACHE_MAX_GB * 1024 ** 3))
+        cache_args = ["-n", str(self.n)] + (["-gpu"] if gpu else [])
 
         self.commands.clear()
+        self.jobs = []
+        primaries = {}
 
         for i in range(self.file_list.count()):
-            file_path = self.file_list.item(i).text()
-            cmd = f"python -m gprMax \"{file_path}\" -n {n}"
-            if gpu:
-                cmd += " --gpu"
-            if use_mpi and mpi_n.isdigit():
-                cmd += f" -mpi {mpi_n}"
-                if no_spawn:
-                    cmd += " --mpi-no-spawn"
-            self.commands.append(cmd)
-            Popen(cmd, shell=True)
+            item = self.file_list.item(i)
+            job = BatchJob(item.data(Qt.UserRole), item)
+            self.jobs.append(job)
+            job.key = file_hash(job.file_path)
+            if self.ledger_for(job.file_path).is_complete(job.file_path, self.n, key=job.key):
+                job.status = "skipped"
+                continue
+
+            if self.cache:
+                job.ckey = cache_key(job.file_path, cache_args)
+                if job.ckey in primaries:
+                    # Same model already queued in this batch, reuse its result
+                    primaries[job.ckey].duplicates.append(job)
+                    job.status = "waiting"
+                    continue
+                if self.reuse_cached(job.file_path, self.n, self.cache, job.ckey, key=job.key):
+                    job.status = "cached"
+                    continue
+                primaries[job.ckey] = job
+
+        self.paused = False
+        self.pause_btn.setText("Pause")
+        self.set_running(True)
+        self.batch_started = time.time()
+        self.process_queue()
+        self.queue_timer.start()
+
+    def set_running(self, running):
+        self.run_btn.setEnabled(not running)
+        self.clear_btn.setEnabled(not running)
+        self.pause_btn.setEnabled(running)
+        self.cancel_btn.setEnabled(running)
+
+    def start_job(self, job):
+        cmd = self.build_command(job.file_path)
+        self.commands.append(subprocess.list2cmdline(cmd))
+        self.ledger_for(job.file_path).start(job.file_path, self.n, key=job.key)
+        # Each run writes its own log so concurrent output doesn't interleave
+        log_path = os.path.splitext(job.file_path)[0] + ".log"
+        try:
+            with open(log_path, "w") as log:
+                job.process = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT)
+        except OSError:
+            job.status = "failed"
+            self.ledger_for(job.file_path).finish(job.file_path, -1, key=job.key)
+            return
+        job.status = "running"
+        job.started = time.time()
+        if self.run_manager is not None:
+            job.run = self.run_manager.register(self.commands[-1], "batch", job.process, log_path)
+
+    def finish_job(self, job, returncode):
+        job.finished = time.time()
+        job.status = "done" if returncode == 0 else "failed"
+        self.ledger_for(job.file_path).finish(job.file_path, returncode, key=job.key)
+        if returncode == 0 and self.cache:
+            threading.Thread(target=self.store_result, args=(job,), daemon=True).start()
+        else:
+            for duplicate in job.duplicates:
+                duplicate.status = "queued"
+
+    def process_queue(self):
+        for job in self.jobs:
+            if job.status == "running" and job.process.poll() is not None:
+                self.finish_job(job, job.process.returncode)
+
+        running = sum(1 for job in self.jobs if job.status == "running")
+        if not self.paused:
+            for job in self.jobs:
+                if running >= self.concurrency_input.value():
+                    break
+                if job.status == "queued":
+                    self.start_job(job)
+                    running += job.status == "running"
+
+        self.update_rows()
+        if not any(job.status in ("queued", "running", "waiting") for job in self.jobs):
+            self.queue_timer.stop()
+            self.set_running(False)
+            self.show_summary()
+
+    def update_rows(self):
+        counts = {}
+        for job in self.jobs:
+            counts[job.status] = counts.get(job.status, 0) + 1
+            text = f"[{job.status}] {job.file_path}"
+            if job.started is not None:
+                text += f"  ({time.strftime('%H:%M:%S', time.gmtime(job.elapsed()))})"
+            job.item.setText(text)
+        summary = ", ".join(f"{count} {status}" for status, count in sorted(counts.items()))
+        if self.paused:
+            summary += " (paused)"
+        self.status_label.setText(summary)
+
+    def toggle_pause(self):
+        self.paused = not self.paused
+        self.pause_btn.setText("Resume" if self.paused else "Pause")
+        self.update_rows()
+
+    def cancel_all(self):
+        for job in self.jobs:
+            if job.status == "running":
+                if job.run is not None:
+                    job.run.kill()
+                else:
+                    job.process.kill()
+                job.process.wait()
+                job.finished = time.time()
+                job.status = "cancelled"
+                self.ledger_for(job.file_path).finish(job.file_path, job.process.returncode, key=job.key)
+            elif job.status in ("queued", "waiting"):
+                with self.status_lock:
+                    job.status = "cancelled"
+        self.process_queue()
+
+    def show_summary(self):
+        counts = {}
+        for job in self.jobs:
+            counts[job.status] = counts.get(job.status, 0) + 1
+        total_time = time.strftime('%H:%M:%S', time.gmtime(time.time() - self.batch_started))
+        lines = [f"{status}: {count}" for status, count in sorted(counts.items())]
+        QMessageBox.information(self, "Batch Finished",
+                                f"Batch finished in {total_time}.\n\n" + "\n".join(lines))
+
+    def reject(self):
+        if any(job.status == "running" for job in self.jobs):
+            reply = QMessageBox.question(self, "Batch Running",
+                                         "Simulations are still running. Cancel them and close?",
+                                         QMessageBox.Yes | QMessageBox.No)
+            if reply != QMessageBox.Yes:
+                return
+            self.queue_timer.stop()
+            self.cancel_all()
+        super().reject()
+
+class LazyOutputFile:
+    """An open gprMax output file that reads single traces on demand.
+
+    Nothing but the metadata is read when the file is opened; trace() reads one
+    column of one component and keeps recent traces in an LRU (shared between
+    files when opened through an OutputFileCache), so stepping back and forth
+    doesn't go to disk again. Handles merged B-scans (iterations x traces, as
+    written by gprMax) as well as files with a 'time' dataset and traces stored
+    row by row.
+    """
+
+    def __init__(self, path, cache=None, cache_size=TRACE_CACHE_SIZE):
+        self.path = path
+        self.file = h5py.File(path, 'r')
+        self.cache = cache if cache is not None else OrderedDict()
+        self.cache_size = cache_size
+        self.meta = {}  # metadata read once: receivers, iterations, time, trace counts
+
+    def close(self):
+        self.file.close()
+        for key in [key for key in self.cache if key[0] == self.path]:
+            del self.cache[key]
+
+    def dataset(self, component, rx="rx1"):
+        return self.file[f"rxs/{rx}/{component}"]
+
+    @property
+    def receivers(self):
+        """Receiver group names, rx1..rxN from the nrx attribute (or the groups present)."""
+        if "receivers" not in self.meta:
+            if "nrx" in self.file.attrs:
+                names = [f"rx{i}" for i in range(1, int(self.file.attrs["nrx"]) + 1)]
+            else:
+                names = sorted(self.file.get("rxs", {}), key=lambda name: int(name[2:]))
+            self.meta["receivers"] = names
+        return self.meta["receivers"]
+
+    @property
+    def iterations(self):
+        if "iterations" not in self.meta:
+            if "Iterations" in self.file.attrs:
+                self.meta["iterations"] = int(self.file.attrs["Iterations"])
+            else:
+                self.meta["iterations"] = len(self.file["time"])
+        return self.meta["iterations"]
+
+    @property
+    def time(self):
+        """Time axis in seconds: the 'time' dataset, else dt x sample number."""
+        if "time" not in self.meta:
+            if "time" in self.file:
+                self.meta["time"] = self.file["time"][:]
+            else:
+                self.meta["time"] = np.arange(self.iterations) * float(self.file.attrs["dt"])
+        return self.meta["time"]
+
+    def trace_axis(self, data):
+        """Axis of data that runs over the traces (the other one is time)."""
+        if data.ndim == 1:
+            return None
+        return 1 if data.shape[0] == self.iterations else 0
+
+    def trace_count(self, component="Ez", rx="rx1"):
+        key = ("traces", rx, component)
+        if key not in self.meta:
+            data = self.dataset(component, rx)
+            axis = self.trace_axis(data)
+            self.meta[key] = 1 if axis is None else data.shape[axis]
+        return self.meta[key]
+
+    def trace(self, component, index, rx="rx1"):
+        """One A-scan of component, read from disk only if not cached."""
+        key = (self.path, rx, component, index)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        data = self.dataset(component, rx)
+        axis = self.trace_axis(data)
+        if axis is None:
+            signal = data[:]
+        elif axis == 1:
+            signal = data[:, index]
+        else:
+            signal = data[index, :]
+        self.cache[key] = signal
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return signal
+
+
+class OutputFileCache:
+    """Bounded LRU of open LazyOutputFiles with one trace cache shared by all.
+
+    Stepping through a sweep reopens the same files over and over; keeping the
+    last OUTPUT_FILE_CACHE_SIZE handles (and their metadata) open avoids paying
+    the h5py open/close each time. The least recently used file is closed when
+    the limit is reached.
+    """
+
+    def __init__(self, max_open=OUTPUT_FILE_CACHE_SIZE, cache_size=TRACE_CACHE_SIZE):
+        self.files = OrderedDict()
+        self.max_open = max_open
+        self.traces = OrderedDict()
+        self.cache_size = cache_size
+
+    def get(self, path):
+        path = os.path.abspath(path)
+        if path in self.files:
+            self.files.move_to_end(path)
+            return self.files[path]
+        output = LazyOutputFile(path, cache=self.traces, cache_size=self.cache_size)
+        self.files[path] = output
+        while len(self.files) > self.max_open:
+            self.files.popitem(last=False)[1].close()
+        return output
+
+    def close_all(self):
+        for output in self.files.values():
+            output.close()
+        self.files.clear()
 
-        QMessageBox.information(self, "Batch Started", "All simulations have been started.")
 
 class OutputDataViewer(QDialog):
     def __init__(self):
@@ -116,12 +739,25 @@ class OutputDataViewer(QDialog):
         self.setMinimumSize(800, 600)
 
         self.file_label = QLabel("No file loaded")
-        self.load_btn = QPushButton("Load .h5 File")
+        self.load_btn = QPushButton("Load Output File")
         self.load_btn.clicked.connect(self.load_file)
+        self.load_dir_btn = QPushButton("Open Folder")
+        self.load_dir_btn.clicked.connect(self.load_directory)
+
+        # Files of the opened folder (or the single opened file)
+        self.file_box = QComboBox()
+        self.file_box.currentIndexChanged.connect(self.select_file)
+        self.prev_btn = QPushButton("<")
+        self.prev_btn.clicked.connect(lambda: self.step_file(-1))
+        self.next_btn = QPushButton(">")
+        self.next_btn.clicked.connect(lambda: self.step_file(1))
+
+        self.rx_box = QComboBox()
+        self.rx_box.currentIndexChanged.connect(self.update_traces)
 
         self.component_box = QComboBox()
         self.component_box.addItems(["Ez", "Ex", "Ey", "Hx", "Hy", "Hz"])
-        self.component_box.currentIndexChanged.connect(self.update_plot)
+        self.component_box.currentIndexChanged.connect(self.update_traces)
 
         self.trace_slider = QSlider(Qt.Horizontal)
         self.trace_slider.setMinimum(0)
@@ -133,56 +769,121 @@ class OutputDataViewer(QDialog):
 
         top_layout = QHBoxLayout()
         top_layout.addWidget(self.load_btn)
+        top_layout.addWidget(self.load_dir_btn)
+        top_layout.addWidget(self.rx_box)
         top_layout.addWidget(self.component_box)
 
+        file_layout = QHBoxLayout()
+        file_layout.addWidget(self.prev_btn)
+        file_layout.addWidget(self.file_box, 1)
+        file_layout.addWidget(self.next_btn)
+
         layout = QVBoxLayout()
         layout.addWidget(self.file_label)
         layout.addLayout(top_layout)
+        layout.addLayout(file_layout)
         layout.addWidget(self.trace_slider)
         layout.addWidget(self.canvas)
 
         self.setLayout(layout)
 
-        self.data = None
-        self.time = None
+        self.files = OutputFileCache()
+        self.output = None  # LazyOutputFile shown
 
     def load_file(self):
-        path, _ = QFileDialog.getOpenFileName(self, "Select .h5 File", "", "HDF5 Files (*.h5)")
+        path, _ = QFileDialog.getOpenFileName(self, "Select output file", "",
+                                              "gprMax output (*.out *.h5);;All Files (*)")
         if path:
-            self.file_label.setText(path)
-            try:
-                with h5py.File(path, 'r') as f:
-                    self.time = f['time'][:]
-                    self.data = {
-                        'Ex': f['rxs/rx1/Ex'][:],
-                        'Ey': f['rxs/rx1/Ey'][:],
-                        'Ez': f['rxs/rx1/Ez'][:],
-                        'Hx': f['rxs/rx1/Hx'][:],
-                        'Hy': f['rxs/rx1/Hy'][:],
-                        'Hz': f['rxs/rx1/Hz'][:]
-                    }
-                    self.trace_slider.setMaximum(self.data['Ez'].shape[0] - 1)
-                    self.trace_slider.setValue(0)
-                    self.update_plot()
-            except Exception as e:
-                self.file_label.setText(f"Error loading file: {e}")
+            self.set_files([path])
+
+    def load_directory(self):
+        folder = QFileDialog.getExistingDirectory(self, "Select folder of output files")
+        if not folder:
+            return
+        paths = sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.endswith((".out", ".h5")))
+        if not paths:
+            self.file_label.setText(f"No .out or .h5 files in {folder}")
+            return
+        self.set_files(paths)
+
+    def set_files(self, paths):
+        self.file_box.blockSignals(True)
+        self.file_box.clear()
+        for path in paths:
+            self.file_box.addItem(os.path.basename(path), path)
+        self.file_box.blockSignals(False)
+        self.file_box.setCurrentIndex(0)
+        self.select_file()
+
+    def step_file(self, step):
+        index = self.file_box.currentIndex() + step
+        if 0 <= index < self.file_box.count():
+            self.file_box.setCurrentIndex(index)
+
+    def select_file(self):
+        path = self.file_box.currentData()
+        if not path:
+            return
+        self.file_label.setText(path)
+        try:
+            self.output = self.files.get(path)
+            receivers = self.output.receivers
+        except Exception as e:
+            self.output = None
+            self.file_label.setText(f"Error loading file: {e}")
+            return
+
+        # Keep the selected receiver when stepping through files that have it
+        current = self.rx_box.currentText()
+        self.rx_box.blockSignals(True)
+        self.rx_box.clear()
+        self.rx_box.addItems(receivers)
+        if current in receivers:
+            self.rx_box.setCurrentText(current)
+        self.rx_box.blockSignals(False)
+        self.update_traces()
+
+    def update_traces(self):
+        """Slider range for the selected receiver and component; keeps the trace number if it fits."""
+        if self.output is None or not self.rx_box.currentText():
+            return
+        try:
+            count = self.output.trace_count(self.component_box.currentText(), self.rx_box.currentText())
+        except KeyError:
+            count = 1
+        self.trace_slider.blockSignals(True)
+        self.trace_slider.setMaximum(count - 1)
+        self.trace_slider.blockSignals(False)
+        self.update_plot()
 
     def update_plot(self):
-        if self.data is None:
+        if self.output is None:
             return
 
+        rx = self.rx_box.currentText()
         component = self.component_box.currentText()
         index = self.trace_slider.value()
 
-        signal = self.data[component][index]
+        try:
+            signal = self.output.trace(component, index, rx)
+        except KeyError:
+            self.ax.clear()
+            self.ax.set_title(f"No {component} for {rx} in this file")
+            self.canvas.draw()
+            return
 
         self.ax.clear()
-        self.ax.plot(self.time * 1e9, signal)
-        self.ax.set_title(f"A-Scan Trace #{index+1} - {component}")
+        self.ax.plot(self.output.time * 1e9, signal)
+        self.ax.set_title(f"A-Scan Trace #{index+1} - {rx} {component}")
         self.ax.set_xlabel("Time (ns)")
         self.ax.set_ylabel("Amplitude")
         self.canvas.draw()
 
+    def closeEvent(self, event):
+        self.files.close_all()
+        self.output = None
+        super().closeEvent(event)
+
 class GPRCompleter(QCompleter):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -859,23 +1560,211 @@ class ImageTab(QWidget):
         layout.addWidget(label)
         self.setLayout(layout)
     
+class OutputBuffer:
+    """Thread-safe line buffer between a process reader thread and the GUI.
+
+    Reader threads append lines; the GUI takes everything pending on a timer.
+    Pending lines are bounded so a stalled GUI can't grow memory without limit;
+    the overflow is counted and reported as dropped. history keeps the last
+    lines for panes that are (re)filled later.
+    """
+
+    def __init__(self, max_pending=SHELL_MAX_LINES, history=SHELL_MAX_LINES):
+        self.lock = threading.Lock()
+        self.pending = deque(maxlen=max_pending)
+        self.history = deque(maxlen=history)
+        self.dropped = 0
+        self.lines = 0
+        self.chars = 0
+
+    def append(self, line):
+        with self.lock:
+            if len(self.pending) == self.pending.maxlen:
+                self.dropped += 1
+            self.pending.append(line)
+            self.history.append(line)
+            self.lines += 1
+            self.chars += len(line) + 1
+
+    def take(self):
+        """Pending lines since the last call (with a note if some were dropped)."""
+        with self.lock:
+            lines = list(self.pending)
+            self.pending.clear()
+            if self.dropped:
+                lines.insert(0, f"[... {self.dropped} lines dropped ...]")
+                self.dropped = 0
+        return lines
+
+
+def parse_progress(line):
+    """Progress event in a line of gprMax output, or None.
+
+    Returns a dict with model/models when the line names the model (trace)
+    being run, plus iteration/iterations and rate (iterations/s) when it is
+    the tqdm bar of the simulation loop.
+    """
+    event = {}
+    match = MODEL_PROGRESS.search(line)
+    if match:
+        event["model"], event["models"] = int(match.group(1)), int(match.group(2))
+    # Only the simulation bar; geometry-building bars have their own counters
+    match = ITERATION_PROGRESS.search(line) if "simulation" in line.lower() else None
+    if match:
+        event["iteration"], event["iterations"] = int(match.group(1)), int(match.group(2))
+        if match.group(3):
+            rate = float(match.group(3))
+            event["rate"] = rate if match.group(4) == "it/s" else (1 / rate if rate else 0.0)
+    return event or None
+
+
+class RunProgress:
+    """Progress of a gprMax run built from parse_progress() events.
+
+    Updated from the reader thread and read by the GUI, so every field is
+    replaced in one assignment (no partial updates to read).
+    """
+
+    def __init__(self):
+        self.model = 0
+        self.models = 0
+        self.iteration = 0
+        self.iterations = 0
+        self.rate = None
+        self.model_started = None
+        self.trace_times = []  # seconds each finished model (trace) took
+        self.last_update = None
+
+    def feed(self, line):
+        """Updates from one output line. Returns the event, or None if it had no progress."""
+        event = parse_progress(line)
+        if event is None:
+            return None
+        now = time.time()
+        model = event.get("model", self.model)
+        if "model" not in event and event.get("iteration", 0) < self.iteration:
+            model += 1  # iteration counter restarted without a model line
+        if model != self.model:
+            if self.model_started is not None:
+                self.trace_times = self.trace_times + [now - self.model_started]
+            self.model_started = now
+            self.model = model
+            self.iteration = 0
+        self.models = event.get("models", self.models)
+        self.iteration = event.get("iteration", self.iteration)
+        self.iterations = event.get("iterations", self.iterations)
+        self.rate = event.get("rate", self.rate)
+        self.last_update = now
+        return event
+
+    @property
+    def started(self):
+        return self.last_update is not None
+
+    def fraction(self):
+        """Share of the run done (0-1), counting the current model's iterations."""
+        if not self.models:
+            return 0.0
+        current = self.iteration / self.iterations if self.iterations else 0.0
+        return min(1.0, (self.model - 1 + current) / self.models)
+
+    def seconds_per_trace(self):
+        if self.trace_times:
+            return sum(self.trace_times[-10:]) / len(self.trace_times[-10:])
+        if self.rate and self.iterations:
+            return self.iterations / self.rate
+        return None
+
+    def eta(self):
+        """Seconds left, from the recent time per trace and the current iteration rate."""
+        per_trace = self.seconds_per_trace()
+        if per_trace is None or not self.models:
+            return None
+        if self.rate and self.iterations:
+            current = (self.iterations - self.iteration) / self.rate
+        elif self.iterations:
+            current = per_trace * (1 - self.iteration / self.iterations)
+        else:
+            current = per_trace
+        return current + per_trace * max(0, self.models - self.model)
+
+    def stalled(self, seconds=STALL_SECONDS):
+        return self.started and time.time() - self.last_update > seconds
+
+    def summary(self):
+        """e.g. 'Trace 3/225 | 12.4 s/trace | 245 it/s | ETA 00:45:10'."""
+        if not self.started:
+            return ""
+        parts = [f"Trace {self.model}/{self.models}" if self.models else f"Trace {self.model}"]
+        per_trace = self.seconds_per_trace()
+        if per_trace is not None:
+            parts.append(f"{per_trace:.1f} s/trace")
+        if self.rate:
+            parts.append(f"{self.rate:.0f} it/s")
+        eta = self.eta()
+        if eta is not None:
+            parts.append("ETA " + time.strftime('%H:%M:%S', time.gmtime(eta)))
+        if self.stalled():
+            parts.append(f"no progress for {time.time() - self.last_update:.0f} s")
+        return " | ".join(parts)
+
+
 class CommandRunner(QObject):
     output_received = pyqtSignal(str)
+    finished = pyqtSignal(int)
 
-    def __init__(self, command):
+    def __init__(self, command, sink=None, progress=None):
         super().__init__()
         self.command = command
+        # With a sink (OutputBuffer) lines are buffered instead of sent one signal each
+        self.sink = sink
+        # With a RunProgress, gprMax progress lines update it and iteration bars
+        # are kept out of the output (they would be thousands of lines per trace)
+        self.progress = progress
+        self.process = None
+
+    def emit_line(self, line):
+        if self.progress is not None:
+            event = self.progress.feed(line)
+            if event is not None and "iteration" in event:
+                return
+        if self.sink is not None:
+            self.sink.append(line)
+        else:
+            self.output_received.emit(line)
 
     def run(self):
+        returncode = -1
         try:
-            process = subprocess.Popen(self.command, shell=True, stdout=subprocess.PIPE,
-                                       stderr=subprocess.STDOUT, universal_newlines=True)
+            self.process = process = subprocess.Popen(self.command, shell=True, stdout=subprocess.PIPE,
+                                                      stderr=subprocess.STDOUT, universal_newlines=True)
+            # universal_newlines turns tqdm's \r redraws into separate lines
             for line in iter(process.stdout.readline, ''):
-                self.output_received.emit(line.rstrip())
+                self.emit_line(line.rstrip())
             process.stdout.close()
-            process.wait()
+            returncode = process.wait()
+        except Exception as e:
+            self.emit_line(f"[Exception] {str(e)}")
+        self.finished.emit(returncode)
+
+class MergeRunner(QObject):
+    output_received = pyqtSignal(str)
+    finished = pyqtSignal(int)
+
+    def __init__(self, base_name, remove_files=False):
+        super().__init__()
+        self.base_name = base_name
+        self.remove_files = remove_files
+
+    def run(self):
+        try:
+            start = time.time()
+            merged = merge_files(self.base_name, removefiles=self.remove_files)
+            self.output_received.emit(f"Merged into {merged} ({time.time() - start:.1f} s)")
+            self.finished.emit(0)
         except Exception as e:
             self.output_received.emit(f"[Exception] {str(e)}")
+            self.finished.emit(1)
 
 class RunDialog(QDialog):
     def __init__(self, default_n=1):
@@ -1293,6 +2182,22 @@ class GPRViewer(QMainWindow):
         self.shell_output.setReadOnly(True)
         self.shell_output.setFont(QFont("Consolas", 11))
         self.shell_output.setStyleSheet("background-color: black; color: lime;")
+        # Ring buffer: old lines are discarded once the pane holds SHELL_MAX_LINES
+        self.shell_output.setMaximumBlockCount(SHELL_MAX_LINES)
+
+        # Each run buffers its output (RunRecord.buffer); this timer appends the
+        # shown run's lines in batches
+        self.shell_rate_label = QLabel("")
+        # Progress of the run shown in the shell pane
+        self.run_progress_bar = QProgressBar()
+        self.run_progress_bar.setRange(0, 1000)
+        self.run_progress_bar.setVisible(False)
+        self.run_progress_label = QLabel("")
+        self.shell_rate_lines = 0
+        self.shell_rate_time = time.time()
+        self.output_timer = QTimer(self)
+        self.output_timer.timeout.connect(self.flush_shell_output)
+        self.output_timer.start(SHELL_FLUSH_MS)
 
         self.shell_input = QLineEdit()
         self.shell_input.setPlaceholderText("Type shell command (PowerShell/CMD)...")
@@ -1303,6 +2208,9 @@ class GPRViewer(QMainWindow):
         shell_layout.setContentsMargins(0, 0, 0, 0)
         shell_layout.addWidget(self.shell_output)
         shell_layout.addWidget(self.shell_input)
+        shell_layout.addWidget(self.run_progress_bar)
+        shell_layout.addWidget(self.run_progress_label)
+        shell_layout.addWidget(self.shell_rate_label)
         self.shell_panel.setLayout(shell_layout)
 
         editor_shell_splitter = QSplitter(Qt.Vertical)
@@ -1321,6 +2229,12 @@ class GPRViewer(QMainWindow):
         container.setLayout(layout)
         self.setCentralWidget(container)
 
+        # Every run started from the IDE, with its own captured output
+        self.run_manager = RunManagerDock(self)
+        self.run_manager.run_selected.connect(self.focus_run)
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.run_manager)
+        self.focused_run = None
+
         self.create_actions()
         self.create_menu()
         self.create_toolbar()
@@ -1737,8 +2651,7 @@ class GPRViewer(QMainWindow):
                         return
                     cmd += f" -mpi {mpi_processes}"
 
-            self.shell_output.appendPlainText(f"> {cmd}")
-            self.run_command(cmd)
+            self.run_command(cmd, "gprMax")
 
 
     def merge_output_files(self):
@@ -1750,12 +2663,16 @@ class GPRViewer(QMainWindow):
                 QMessageBox.warning(self, "Missing Base Name", "Please enter a valid base name.")
                 return
 
-            cmd = f"python -m tools.outputfiles_merge {base_name}"
-            if remove_flag:
-                cmd += " --remove-files"
-
-            self.shell_output.appendPlainText(f"> {cmd}")
-            self.run_command(cmd)
+            command = f"merge {base_name}" + (" --remove-files" if remove_flag else "")
+            # Merges run in-process, so they are listed without a PID
+            record = self.run_manager.register(command, "merge")
+            record.buffer.append(f"> {command}")
+            merger = MergeRunner(base_name, remove_flag)
+            merger.output_received.connect(record.buffer.append)
+            merger.finished.connect(record.finish)
+            record.runner = merger
+            threading.Thread(target=merger.run, daemon=True).start()
+            self.run_manager.select(record.id)
 
 
         
@@ -1783,8 +2700,7 @@ class GPRViewer(QMainWindow):
             if gpu.lower() == "yes":
                 cmd += " --gpu"
 
-            self.shell_output.appendPlainText(f"> {cmd}")
-            self.run_command(cmd)
+            self.run_command(cmd, "plot")
 
         
 
@@ -1814,22 +2730,72 @@ class GPRViewer(QMainWindow):
             if dpi and dpi.isdigit():
                 cmd += f" --dpi {dpi}"
 
-            self.shell_output.appendPlainText(f"> {cmd}")
-            self.run_command(cmd)
+            self.run_command(cmd, "plot")
 
     def execute_shell_command(self):
         cmd = self.shell_input.text().strip()
         if not cmd:
             return
-        self.shell_output.appendPlainText(f"> {cmd}")
         self.run_command(cmd)
         self.shell_input.clear()
 
-    def run_command(self, cmd):
-        self.runner = CommandRunner(cmd)
-        self.runner.output_received.connect(self.shell_output.appendPlainText)
-        thread = threading.Thread(target=self.runner.run)
+    def run_command(self, cmd, kind="shell"):
+        record = self.run_manager.register(cmd, kind)
+        record.buffer.append(f"> {cmd}")
+        record.runner = CommandRunner(cmd, sink=record.buffer, progress=record.progress)
+        record.runner.finished.connect(record.finish)
+        thread = threading.Thread(target=record.runner.run, daemon=True)
         thread.start()
+        # Show the new run's output; earlier runs keep theirs in the run manager
+        self.run_manager.select(record.id)
+        return record
+
+    def focus_run(self, run_id):
+        """Shows the output of run_id in the shell pane."""
+        self.focused_run = run_id
+        record = self.run_manager.runs[run_id]
+        record.buffer.take()  # already part of the history shown below
+        self.shell_output.setPlainText("\n".join(record.buffer.history))
+        self.shell_output.moveCursor(QTextCursor.End)
+
+    def update_run_progress(self):
+        """Progress bar and per-trace timing/ETA of the run shown in the shell pane."""
+        record = self.run_manager.runs.get(self.focused_run)
+        if record is None or not record.progress.started:
+            self.run_progress_bar.setVisible(False)
+            self.run_progress_label.setText("")
+            return
+        progress = record.progress
+        self.run_progress_bar.setVisible(True)
+        done = record.status != "running"
+        self.run_progress_bar.setValue(1000 if done and record.returncode == 0 else int(progress.fraction() * 1000))
+        self.run_progress_bar.setFormat(f"Trace {progress.model}/{progress.models} (%p%)")
+        stalled = not done and progress.stalled()
+        self.run_progress_label.setStyleSheet("color: red;" if stalled else "")
+        self.run_progress_label.setText(f"{record.status}: {progress.summary()}" if done else progress.summary())
+
+    def flush_shell_output(self):
+        lines = []
+        for run_id, record in self.run_manager.runs.items():
+            pending = record.buffer.take()
+            if run_id == self.focused_run:
+                lines += pending
+        if lines:
+            # One append (and one repaint) for everything received since the last tick
+            self.shell_output.appendPlainText("\n".join(lines))
+
+        self.update_run_progress()
+
+        now = time.time()
+        if now - self.shell_rate_time >= 1.0:
+            total = self.run_manager.removed_lines + sum(r.buffer.lines for r in self.run_manager.runs.values())
+            received = total - self.shell_rate_lines
+            rate = received / (now - self.shell_rate_time)
+            self.shell_rate_label.setText(f"Output: {rate:.0f} lines/s, "
+                                          f"{self.shell_output.blockCount()}/{SHELL_MAX_LINES} lines kept"
+                                          if received else "")
+            self.shell_rate_lines = total
+            self.shell_rate_time = now
 
     def load_file_from_explorer(self, index):
         path = self.model.filePath(index)
@@ -1983,7 +2949,7 @@ class GPRViewer(QMainWindow):
             self.tabs.setCurrentWidget(tab)
     
     def open_batch_run_dialog(self):
-        dlg = BatchRunDialog()
+        dlg = BatchRunDialog(self.run_manager)
         dlg.exec_()
     
     def open_examples_folder(self):
@@ -2031,8 +2997,7 @@ class GPRViewer(QMainWindow):
             if zcells:
                 cmd += f" -zcells {zcells}"
 
-            self.shell_output.appendPlainText(f"> {cmd}")
-            self.run_command(cmd)
+            self.run_command(cmd, "convert")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,166 @@
+import os
+import math
+
+# Speed of light in vacuum (m/s), as used by gprMax
+C0 = 299792458.0
+
+
+def parse_commands(lines):
+    """Parses .in file lines into a list of (command, [arguments]) tuples.
+
+    Only lines starting with '#' are commands; everything else is treated as a
+    comment, the same way gprMax does.
+    """
+    commands = []
+    for line in lines:
+        line = line.strip()
+        if not line.startswith("#") or ":" not in line:
+            continue
+        name, _, args = line.partition(":")
+        commands.append((name.strip(), args.split()))
+    return commands
+
+
+def read_commands(filepath):
+    """Reads a gprMax .in file into a list of (command, [arguments]) tuples."""
+    with open(filepath, "r") as f:
+        return parse_commands(f)
+
+
+def get_command(commands, name, default=None):
+    """Returns the arguments of the first command called name."""
+    for cmd, args in commands:
+        if cmd == name:
+            return args
+    return default
+
+
+def output_dir(filepath, commands=None):
+    """Directory gprMax writes the outputs of filepath to."""
+    if commands is None:
+        commands = read_commands(filepath)
+    input_dir = os.path.dirname(os.path.abspath(filepath))
+    args = get_command(commands, "#output_dir")
+    if args:
+        return os.path.join(input_dir, " ".join(args))
+    return input_dir
+
+
+def output_paths(filepath, n, commands=None):
+    """Paths of the .out files a run of filepath with -n n produces."""
+    stem = os.path.splitext(os.path.basename(filepath))[0]
+    directory = output_dir(filepath, commands)
+    if n == 1:
+        return [os.path.join(directory, f"{stem}.out")]
+    return [os.path.join(directory, f"{stem}{i}.out") for i in range(1, n + 1)]
+
+
+# Commands whose source position is moved by #src_steps (position follows polarisation)
+SOURCE_COMMANDS = ("#hertzian_dipole", "#magnetic_dipole", "#voltage_source", "#transmission_line")
+
+
+def domain_bounds(commands):
+    """Usable region of the domain, excluding the PML, as ([lower xyz], [upper xyz]) in metres."""
+    size = [float(v) for v in get_command(commands, "#domain")[:3]]
+    d = [float(v) for v in get_command(commands, "#dx_dy_dz")[:3]]
+    pml = get_command(commands, "#pml_cells", ["10"])
+    if len(pml) == 1:
+        pml = pml * 6
+    pml = [int(v) for v in pml]
+    lower = [pml[i] * d[i] for i in range(3)]
+    upper = [size[i] - pml[i + 3] * d[i] for i in range(3)]
+    return lower, upper
+
+
+def steps_that_fit(position, step, lower, upper):
+    """How many positions position, position + step, ... stay inside [lower, upper]."""
+    n = None
+    for i in range(3):
+        if step[i] == 0:
+            continue
+        limit = upper[i] if step[i] > 0 else lower[i]
+        # Small tolerance so a position exactly on the PML edge still counts
+        fit = int((limit - position[i]) / step[i] + 1e-9) + 1
+        n = fit if n is None else min(n, fit)
+    return n
+
+
+def max_traces(commands):
+    """Largest -n for which every stepped source and receiver stays out of the PML.
+
+    Returns None if the model has no #src_steps/#rx_steps.
+    """
+    lower, upper = domain_bounds(commands)
+    counts = []
+    src_steps = get_command(commands, "#src_steps")
+    rx_steps = get_command(commands, "#rx_steps")
+    for cmd, args in commands:
+        if src_steps and cmd in SOURCE_COMMANDS:
+            position = [float(v) for v in args[1:4]]
+            counts.append(steps_that_fit(position, [float(v) for v in src_steps], lower, upper))
+        elif rx_steps and cmd == "#rx":
+            position = [float(v) for v in args[:3]]
+            counts.append(steps_that_fit(position, [float(v) for v in rx_steps], lower, upper))
+    counts = [n for n in counts if n is not None]
+    if not counts:
+        return None
+    return max(0, min(counts))
+
+
+def expected_traces(filepath, cap=None):
+    """Number of traces a B-scan of filepath has, capped at cap (e.g. the -n used).
+
+    A model without #src_steps/#rx_steps is run once, so it has one trace.
+    """
+    n = max_traces(read_commands(filepath))
+    if n is None:
+        return 1
+    if cap is not None:
+        return min(n, cap)
+    return n
+
+
+def grid_cells(commands):
+    """Number of cells (nx, ny, nz) of the domain."""
+    size = [float(v) for v in get_command(commands, "#domain")[:3]]
+    d = [float(v) for v in get_command(commands, "#dx_dy_dz")[:3]]
+    return tuple(max(1, int(round(size[i] / d[i]))) for i in range(3))
+
+
+def time_step(commands):
+    """Time step gprMax uses: the CFL limit of the grid.
+
+    A domain that is one cell thick in some direction is run as a 2D model, and
+    that direction drops out of the limit (e.g. nz == 1 for the TMz models here).
+    """
+    d = [float(v) for v in get_command(commands, "#dx_dy_dz")[:3]]
+    cells = grid_cells(commands)
+    spacing = [d[i] for i in range(3) if cells[i] > 1] or d
+    dt = 1 / (C0 * math.sqrt(sum(1 / s ** 2 for s in spacing)))
+    factor = get_command(commands, "#time_step_stability_factor")
+    if factor:
+        dt *= float(factor[0])
+    return dt
+
+
+def iterations(commands):
+    """Number of time steps of a run.
+
+    #time_window is either a time in seconds or, when written without a '.' or
+    an exponent, a number of iterations (the same rule gprMax applies).
+    """
+    window = get_command(commands, "#time_window")[0]
+    if "." in window or "e" in window.lower():
+        return int(math.ceil(float(window) / time_step(commands))) + 1
+    return int(window)
+
+
+def model_cost(commands, n=None):
+    """Relative cost of a run: domain cells x iterations x traces.
+
+    n is the number of traces run (-n); by default as many as fit in the domain.
+    """
+    nx, ny, nz = grid_cells(commands)
+    if n is None:
+        n = max_traces(commands) or 1
+    return nx * ny * nz * iterations(commands) * n
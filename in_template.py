@@ -0,0 +1,107 @@
+"""Compiled templates for writing gprMax .in files in bulk.
+
+A template is the text of an .in file with {name} placeholders. Compiling it
+splits the text into runs of constant lines, which are kept as ready-made
+strings, and the few lines that contain placeholders, which are the only ones
+formatted per model. Each file is then written with a single write() call.
+
+    template = InTemplate(\"\"\"#title: r={radius}
+    #domain: 15 11 0.002
+    #cylinder: 6 1 0 6 1 0.002 {radius} pvc
+    \"\"\")
+    template.write("model.in", {"radius": 0.05})
+
+Run this module to benchmark the generate5d.py template (files/sec).
+"""
+
+import os
+import time
+import string
+import shutil
+import argparse
+import tempfile
+
+_formatter = string.Formatter()
+
+
+def has_fields(line):
+    return any(field is not None for _, field, _, _ in _formatter.parse(line))
+
+
+class InTemplate:
+    """An .in file template compiled into constant text and varying lines."""
+
+    def __init__(self, text):
+        self.parts = []  # (constant text before the line, format_map of the varying line)
+        self.fields = set()
+        constant = []
+        for line in text.splitlines(keepends=True):
+            if has_fields(line):
+                self.parts.append(("".join(constant), line.format_map))
+                self.fields.update(field.split("[")[0].split(".")[0]
+                                   for _, field, _, _ in _formatter.parse(line) if field)
+                constant = []
+            else:
+                # Unescape {{ and }} once, here, instead of on every render
+                constant.append(line.format())
+        self.tail = "".join(constant)
+
+    def render(self, params):
+        """Text of the .in file for one model."""
+        out = []
+        for constant, fmt in self.parts:
+            out.append(constant)
+            out.append(fmt(params))
+        out.append(self.tail)
+        return "".join(out)
+
+    def write(self, filename, params):
+        with open(filename, "w") as f:
+            f.write(self.render(params))
+
+    def write_all(self, items):
+        """Writes (filename, params) pairs. Returns the number of files written."""
+        count = 0
+        for filename, params in items:
+            self.write(filename, params)
+            count += 1
+        return count
+
+
+def benchmark(template, models, directory):
+    """Times rendering alone and rendering plus writing. Returns (render/s, files/s)."""
+    models = list(models)
+
+    start = time.perf_counter()
+    for _, params in models:
+        template.render(params)
+    render_rate = len(models) / max(time.perf_counter() - start, 1e-9)
+
+    start = time.perf_counter()
+    template.write_all((os.path.join(directory, f"{name}.in"), params) for name, params in models)
+    write_rate = len(models) / max(time.perf_counter() - start, 1e-9)
+    return render_rate, write_rate
+
+
+if __name__ == "__main__":
+
+    import itertools
+    import generate5d
+
+    parser = argparse.ArgumentParser(description='Benchmarks the compiled .in template of generate5d.py.',
+                                     usage='python in_template.py --models 10000')
+    parser.add_argument('--models', type=int, default=10000, help='number of models to generate')
+    parser.add_argument('--dir', default=None, help='folder to write into (default: a temporary folder)')
+    args = parser.parse_args()
+
+    directory = args.dir or tempfile.mkdtemp(prefix="in_template_")
+    os.makedirs(directory, exist_ok=True)
+    models = itertools.islice(generate5d.iter_models(), args.models)
+    try:
+        render_rate, write_rate = benchmark(generate5d.MODEL_TEMPLATE, models, directory)
+    finally:
+        if args.dir is None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    print(f"Rendered {render_rate:,.0f} models/sec")
+    print(f"Written  {write_rate:,.0f} files/sec into '{directory}'")
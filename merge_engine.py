@@ -0,0 +1,165 @@
+"""In-process replacement for `python -m tools.outputfiles_merge`.
+
+Reads the per-trace .out files of a B-scan once each, fills one preallocated
+(iterations x traces) array per receiver output and writes the merged file in a
+single pass. The layout matches the file written by gprMax's own merge tool.
+"""
+
+import os
+import re
+import glob
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import h5py
+import numpy as np
+
+
+def find_trace_files(basefilename):
+    """Trace files basefilename1.out, basefilename2.out, ... sorted by model number."""
+    regex = re.compile(re.escape(os.path.basename(basefilename)) + r"(\d+)\.out$")
+    numbered = []
+    for path in glob.glob(glob.escape(basefilename) + "*.out"):
+        match = regex.match(os.path.basename(path))
+        if match:
+            numbered.append((int(match.group(1)), path))
+    numbered.sort()
+    return [path for _, path in numbered]
+
+
+def merge_files(basefilename, files=None, outputfile=None, removefiles=False, stats=None):
+    """Merges the trace files of basefilename into basefilename_merged.out.
+
+    Args:
+        basefilename (str): Path and prefix of the trace files.
+        files (list): Trace files in trace order (found from basefilename if None).
+        outputfile (str): Merged file name (basefilename + '_merged.out' if None).
+        removefiles (bool): Delete the trace files once the merge is written.
+        stats (dict): If given, filled with read/write timings and byte counts.
+
+    Returns:
+        outputfile (str): Path of the merged file.
+    """
+    if files is None:
+        files = find_trace_files(basefilename)
+    if not files:
+        raise FileNotFoundError(f"No trace files found for {basefilename}")
+    if outputfile is None:
+        outputfile = basefilename + "_merged.out"
+    ntraces = len(files)
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+
+    # Preallocate one array per receiver output from the first trace's layout
+    with h5py.File(files[0], "r") as fin:
+        attrs = dict(fin.attrs)
+        iterations = int(fin.attrs["Iterations"])
+        rx_attrs = {}
+        data = {}
+        for rx in range(1, int(fin.attrs["nrx"]) + 1):
+            path = f"/rxs/rx{rx}"
+            rx_attrs[path] = dict(fin[path].attrs)
+            for output, dset in fin[path].items():
+                data[f"{path}/{output}"] = np.empty((iterations, ntraces), dtype=dset.dtype)
+
+    for trace, filename in enumerate(files):
+        with h5py.File(filename, "r") as fin:
+            for path, array in data.items():
+                array[:, trace] = fin[path][()]
+    read_done = time.perf_counter()
+
+    # Write to a temporary name first so a reader never sees a partial merge
+    tmpfile = outputfile + ".tmp"
+    with h5py.File(tmpfile, "w") as fout:
+        for name in ("Title", "gprMax", "Iterations", "dt", "nrx"):
+            if name in attrs:
+                fout.attrs[name] = attrs[name]
+        for path, values in rx_attrs.items():
+            grp = fout.create_group(path)
+            grp.attrs.update(values)
+        for path, array in data.items():
+            fout.create_dataset(path, data=array)
+    os.replace(tmpfile, outputfile)
+
+    if stats is not None:
+        stats.update(base=basefilename, files=ntraces,
+                     bytes_read=sum(os.path.getsize(f) for f in files),
+                     bytes_written=os.path.getsize(outputfile),
+                     read_s=read_done - wall_start,
+                     write_s=time.perf_counter() - read_done,
+                     wall_s=time.perf_counter() - wall_start,
+                     cpu_s=time.process_time() - cpu_start)
+
+    if removefiles:
+        for filename in files:
+            os.remove(filename)
+
+    return outputfile
+
+
+def timed_merge(basefilename, files=None, outputfile=None, removefiles=False):
+    """merge_files wrapper for worker processes; returns the timing stats."""
+    stats = {"base": basefilename}
+    try:
+        stats["outputfile"] = merge_files(basefilename, files, outputfile, removefiles, stats)
+    except Exception as e:
+        stats["error"] = str(e)
+    return stats
+
+
+def merge_groups_parallel(groups, max_workers=4, removefiles=False, pool=None):
+    """Merges independent groups in a process pool, yielding stats as each finishes.
+
+    groups is a list of (basefilename, files, outputfile) tuples. max_workers
+    bounds how many merges read from disk at the same time. Pass pool (a
+    ProcessPoolExecutor) to reuse one pool across calls instead of starting
+    max_workers new processes every time.
+    """
+    if pool is None:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            yield from merge_groups_parallel(groups, removefiles=removefiles, pool=pool)
+        return
+    futures = [pool.submit(timed_merge, base, files, outputfile, removefiles)
+               for base, files, outputfile in groups]
+    for future in as_completed(futures):
+        yield future.result()
+
+
+def print_timing_report(all_stats, wall_time, max_workers):
+    """Per-group timings plus a hint whether the merges were disk or CPU bound."""
+    print(f"\n{'group':<50} {'files':>5} {'MB':>8} {'read s':>7} {'write s':>7} {'cpu s':>7} {'MB/s':>7}")
+    for st in sorted(all_stats, key=lambda st: st["base"]):
+        if "error" in st:
+            print(f"{os.path.basename(st['base']):<50} failed: {st['error']}")
+            continue
+        mb = st["bytes_read"] / 1e6
+        print(f"{os.path.basename(st['base']):<50} {st['files']:>5} {mb:>8.1f} {st['read_s']:>7.2f} "
+              f"{st['write_s']:>7.2f} {st['cpu_s']:>7.2f} {mb / st['wall_s']:>7.1f}")
+
+    ok = [st for st in all_stats if "error" not in st]
+    if not ok or wall_time <= 0:
+        return
+    total_mb = sum(st["bytes_read"] for st in ok) / 1e6
+    busy = sum(st["wall_s"] for st in ok)
+    cpu = sum(st["cpu_s"] for st in ok)
+    print(f"\n{len(ok)} groups, {total_mb:.1f} MB in {wall_time:.1f} s "
+          f"({total_mb / wall_time:.1f} MB/s aggregate, {max_workers} workers)")
+    # Workers that spend most of their wall time on the CPU are compute bound;
+    # otherwise they are waiting on the disk and more workers won't help much
+    cpu_share = cpu / busy if busy else 0.0
+    bound = "CPU" if cpu_share > 0.7 else "disk"
+    print(f"CPU time / wall time per merge: {cpu_share:.0%} -> likely {bound} bound")
+
+
+if __name__ == "__main__":
+
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(description='Merges traces (A-scans) from multiple output files into one new file, then optionally removes the series of output files.',
+                                     usage='python merge_engine.py basefilename')
+    parser.add_argument('basefilename', help='base name of output file series including path')
+    parser.add_argument('--remove-files', action='store_true', default=False, help='flag to remove individual output files after merge')
+    args = parser.parse_args()
+
+    merged = merge_files(args.basefilename, removefiles=args.remove_files)
+    print(f"Merged into {merged}")
@@ -18,10 +18,11 @@
 
 import argparse
 import os
+import struct
+import zlib
 
 import h5py
 import numpy as np
-import matplotlib.pyplot as plt
 
 from gprMax.exceptions import CmdInputError
 from .outputfiles_merge import get_output_data
@@ -29,7 +30,10 @@ from .outputfiles_merge import get_output_data
 
 def mpl_plot(filename, outputdata, dt, rxnumber, rxcomponent):
     """Creates and saves a plot (with matplotlib) of the B-scan."""
-    
+
+    # Imported here so the raster export path never loads matplotlib
+    import matplotlib.pyplot as plt
+
     (path, base_filename) = os.path.split(filename)
 
     fig = plt.figure(num=base_filename + ' - rx' + str(rxnumber),
@@ -59,6 +63,71 @@ def mpl_plot(filename, outputdata, dt, rxnumber, rxcomponent):
     return plt
 
 
+def bscan_to_uint8(outputdata, size=None):
+    """Maps a B-scan to an 8-bit grayscale raster.
+
+    Uses the same symmetric scaling as mpl_plot (vmin=-max|data|, vmax=+max|data|)
+    and the same 256-level lookup the grey colormap applies, so the pixels match
+    the image area of the matplotlib plot.
+
+    Args:
+        outputdata (array): Array of A-scans, i.e. B-scan data (samples x traces).
+        size (tuple): Optional (height, width) to resample to (nearest neighbour,
+                      like interpolation='nearest').
+
+    Returns:
+        raster (array): uint8 array.
+    """
+    vmax = np.amax(np.abs(outputdata))
+    if vmax == 0:
+        normed = np.full(outputdata.shape, 0.5)
+    else:
+        normed = (outputdata / vmax + 1) / 2
+    raster = np.clip((normed * 256).astype(np.int32), 0, 255).astype(np.uint8)
+
+    if size is not None:
+        height, width = size
+        rows = np.arange(height) * raster.shape[0] // height
+        cols = np.arange(width) * raster.shape[1] // width
+        raster = raster[np.ix_(rows, cols)]
+
+    return raster
+
+
+def write_png(filename, raster):
+    """Writes a 2D uint8 array as an 8-bit grayscale PNG (no imaging library needed)."""
+    height, width = raster.shape
+    # Every scanline starts with filter type 0 (None)
+    scanlines = np.zeros((height, width + 1), dtype=np.uint8)
+    scanlines[:, 1:] = raster
+
+    def chunk(tag, data):
+        return (struct.pack('>I', len(data)) + tag + data
+                + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff))
+
+    with open(filename, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0)))
+        f.write(chunk(b'IDAT', zlib.compress(scanlines.tobytes(), 6)))
+        f.write(chunk(b'IEND', b''))
+
+
+def save_raster(filename, outputdata, rxnumber, rxcomponent, fmt='png', size=None, save_dir=None):
+    """Saves the normalised B-scan raster as PNG or NPY, without axes or colorbar."""
+    base_filename = os.path.basename(filename)
+    if save_dir is None:
+        save_dir = os.path.join(os.getcwd(), 'saved_bscans')
+    os.makedirs(save_dir, exist_ok=True)
+    save_path = os.path.join(save_dir, f"{os.path.splitext(base_filename)[0]}_rx{rxnumber}_{rxcomponent}.{fmt}")
+
+    raster = bscan_to_uint8(outputdata, size)
+    if fmt == 'npy':
+        np.save(save_path, raster)
+    else:
+        write_png(save_path, raster)
+    return save_path
+
+
 if __name__ == "__main__":
 
     # Parse command line arguments
@@ -67,6 +136,10 @@ if __name__ == "__main__":
     parser.add_argument('outputfile', help='name of output file including path')
     parser.add_argument('rx_component', help='name of output component to be plotted', 
                         choices=['Ex', 'Ey', 'Ez', 'Hx', 'Hy', 'Hz', 'Ix', 'Iy', 'Iz'])
+    parser.add_argument('--raster', choices=['png', 'npy'], default=None,
+                        help='only export the normalised grayscale B-scan raster (no matplotlib)')
+    parser.add_argument('--size', default=None,
+                        help='raster size as HEIGHTxWIDTH, e.g. 256x256 (default: samples x traces)')
     args = parser.parse_args()
 
     # Open output file and read number of outputs (receivers)
@@ -78,6 +151,15 @@ if __name__ == "__main__":
     if nrx == 0:
         raise CmdInputError('No receivers found in {}'.format(args.outputfile))
 
+    # Fast path for ML datasets: raw raster straight from the array
+    if args.raster:
+        size = tuple(int(v) for v in args.size.lower().split('x')) if args.size else None
+        for rx in range(1, nrx + 1):
+            outputdata, dt = get_output_data(args.outputfile, rx, args.rx_component)
+            save_path = save_raster(args.outputfile, outputdata, rx, args.rx_component, args.raster, size)
+            print(f"✅ Raster saved: {save_path}")
+        raise SystemExit
+
     # Create output folder
     output_dir = os.path.join(os.getcwd(), 'saved_plots')
     os.makedirs(output_dir, exist_ok=True)
@@ -0,0 +1,162 @@
+import os
+import shutil
+import uuid
+import hashlib
+import threading
+
+from batch_ledger import merged_path
+from in_parser import output_paths
+from merge_engine import merge_files
+
+# Commands that don't change the simulated fields
+IGNORED_COMMANDS = ("#title", "#output_dir")
+
+
+def normalise_in(filepath):
+    """Canonical form of a .in file used for hashing.
+
+    Comments, blank lines, titles and output folders are dropped, whitespace is
+    collapsed and numbers are rewritten so that 0.2, 0.20 and 2e-1 hash the same.
+    """
+    lines = []
+    with open(filepath, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line.startswith("#") or ":" not in line:
+                continue
+            name, _, args = line.partition(":")
+            name = name.strip()
+            if name in IGNORED_COMMANDS:
+                continue
+            tokens = []
+            for token in args.split():
+                try:
+                    tokens.append(repr(float(token)))
+                except ValueError:
+                    tokens.append(token)
+            lines.append(f"{name}: {' '.join(tokens)}")
+    return "\n".join(lines)
+
+
+def cache_key(filepath, args):
+    """Hash of the normalised model plus the gprMax arguments (-n, -gpu, ...)."""
+    h = hashlib.sha256()
+    h.update(normalise_in(filepath).encode())
+    h.update(("\n" + " ".join(str(a) for a in args)).encode())
+    return h.hexdigest()
+
+
+class ResultCache:
+    """Directory of merged .out files named by cache key, evicted LRU by size.
+
+    A file's mtime is bumped every time it is used, so the oldest mtime is the
+    least recently used entry.
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        # Concurrent jobs share one cache; evicting the same entry twice would fail
+        self.lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.out")
+
+    def lookup(self, key):
+        """Returns the cached file for key (marking it used) or None."""
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+        os.utime(path, None)
+        return path
+
+    def fetch(self, key, dest):
+        """Copies the cached result for key to dest. Returns False on a miss."""
+        path = self.lookup(key)
+        if path is None:
+            return False
+        tmp = dest + ".part"
+        shutil.copyfile(path, tmp)
+        os.replace(tmp, dest)
+        return True
+
+    def partial(self, key):
+        """Unique temporary path in the cache folder to build the entry of key in."""
+        return os.path.join(self.cache_dir, f"{key}.{uuid.uuid4().hex}.part")
+
+    def add(self, key, built_file):
+        """Moves a file built at partial(key) into the cache."""
+        os.replace(built_file, self.path(key))
+        self.evict()
+
+    def store(self, key, merged_file):
+        tmp = self.partial(key)
+        shutil.copyfile(merged_file, tmp)
+        self.add(key, tmp)
+
+    def evict(self):
+        with self.lock:
+            entries = []
+            total = 0
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    try:
+                        if entry.name.endswith(".out") and entry.is_file():
+                            st = entry.stat()
+                            entries.append((st.st_mtime, st.st_size, entry.path))
+                            total += st.st_size
+                    except FileNotFoundError:
+                        continue  # removed by another process meanwhile
+            entries.sort()
+            for mtime, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+
+def store_run(cache, key, input_path, n):
+    """Adds the outputs of a finished run to the cache, merging them if needed.
+
+    The merge is built inside the cache folder, never under the merged name the
+    collectors use, so the group still looks unprocessed to them and the trace
+    files are left alone. Returns the cache entry, or None if the outputs are
+    missing.
+    """
+    outputs = output_paths(input_path, n)
+    merged = merged_path(input_path, outputs) if n > 1 else outputs[0]
+    if os.path.exists(merged):
+        # Already merged by a collector (or a single trace)
+        cache.store(key, merged)
+        return cache.path(key)
+    if not all(os.path.exists(p) for p in outputs):
+        return None
+    base = os.path.splitext(merged)[0][:-len("_merged")]
+    tmp = cache.partial(key)
+    try:
+        merge_files(base, files=outputs, outputfile=tmp)
+    except (OSError, KeyError) as e:
+        print(f"Cache: merge failed for {base}: {e}")
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return None
+    cache.add(key, tmp)
+    return cache.path(key)
+
+
+def fetch_run(cache, key, input_path, n):
+    """Materialises a cached result as the merged output of input_path.
+
+    Only the merged file is written (no trace files); the collectors pick such
+    files up as merged but not yet processed.
+    """
+    outputs = output_paths(input_path, n)
+    dest = merged_path(input_path, outputs) if n > 1 else outputs[0]
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    if cache.fetch(key, dest):
+        return dest
+    return None
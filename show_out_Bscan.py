@@ -1,53 +1,43 @@
 import os
-import subprocess
+import re
+
+from merge_engine import merge_files
+from batch_plot_Bscan import render_bscans
+
 
 def merge_outfiles(output_files, output_files_dir):
-    for i, output_filename in enumerate(output_files):
-        output_filepath = os.path.join(output_files_dir, output_filename)
+    """Merges each group of trace files (name_1.out, name_2.out, ...) and returns the merged files."""
+    groups = {}
+    for output_filename in output_files:
+        match = re.match(r"(.+_)\d+\.out$", output_filename)
+        if match:
+            groups.setdefault(match.group(1), []).append(output_filename)
 
-        print(f"\n--- Merging for file {i+1}/{len(output_files)}: {output_filename} ---")
+    merged_files = []
+    for i, base_name in enumerate(sorted(groups)):
+        basefilepath = os.path.join(output_files_dir, base_name)
 
-        command = [
-            "python",
-            "-m",
-            "tools.outputfiles_merge",
-            output_filepath,
-            "--remove-files"
-        ]
+        print(f"\n--- Merging group {i+1}/{len(groups)}: {base_name} ({len(groups[base_name])} files) ---")
 
         try:
-            subprocess.run(command, check=True)
-            print(f"{output_filename} merge completed.")
-        except subprocess.CalledProcessError as e:
-            print(f"ERROR: Merge failed for {output_filename}.")
-        except FileNotFoundError:
-            print("ERROR: Python or gprMax not found. Check your environment setup.")
+            merged = merge_files(basefilepath, removefiles=True)
+            merged_files.append(os.path.basename(merged))
+            print(f"{base_name} merge completed.")
+        except (OSError, KeyError) as e:
+            print(f"ERROR: Merge failed for {base_name}: {e}")
         except Exception as e:
             print(f"Unexpected error: {e}")
+    return merged_files
 
-def show_Bscan(output_files, output_files_dir):
-    for i, output_filename in enumerate(output_files):
-        output_filepath = os.path.join(output_files_dir, output_filename)
-
-        print(f"\n--- Plotting B-scan for file {i+1}/{len(output_files)}: {output_filename} ---")
+def show_Bscan(output_files, output_files_dir, workers=None):
+    """Renders the B-scans of all files in one batch (matplotlib is loaded once per worker)."""
+    output_filepaths = [os.path.join(output_files_dir, f) for f in output_files]
 
-        command = [
-            "python",
-            "-m",
-            "tools.plot_Bscan",
-            output_filepath,
-            "Ez"  # You can change this to Ex, Ey, Hx, etc.
-        ]
+    print(f"\n--- Plotting B-scans for {len(output_filepaths)} files ---")
 
-        try:
-            subprocess.run(command, check=True)
-            print(f"Plot for {output_filename} completed.")
-        except subprocess.CalledProcessError as e:
-            print(f"ERROR: Plotting failed for {output_filename}.")
-        except FileNotFoundError:
-            print("ERROR: Python or gprMax not found. Check your environment setup.")
-        except Exception as e:
-            print(f"Unexpected error: {e}")
+    # You can change "Ez" to Ex, Ey, Hx, etc.
+    results = render_bscans(output_filepaths, "Ez", workers=workers)
+    print(f"Plots for {sum(1 for paths in results.values() if paths)}/{len(output_filepaths)} files completed.")
 
 if __name__ == "__main__": 
     # Path to directory containing your .out files
@@ -63,7 +53,7 @@ if __name__ == "__main__":
     else:
         print(f"Found {len(output_files)} .out files to process.")
 
-        merge_outfiles(output_files, output_files_dir)
-        show_Bscan(output_files, output_files_dir)
+        merged_files = merge_outfiles(output_files, output_files_dir)
+        show_Bscan(merged_files, output_files_dir)
 
         print("\nAll simulations processed and B-scans generated.")
@@ -1,10 +1,33 @@
 import os
+import time
+import argparse
+import threading
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
-# --- User-defined fixed number of traces ---
-# This will be applied to ALL simulations run by this script.
-# Make sure this value aligns with how you've set up your #rx and #rx_steps in your .in files.
-FIXED_NUMBER_OF_TRACES = 225 # <--- SET YOUR DESIRED NUMBER OF TRACES HERE
+from batch_ledger import JobLedger, file_hash
+from result_cache import ResultCache, cache_key, store_run, fetch_run
+from cost_estimator import Calibration, estimate, format_bytes
+from in_parser import expected_traces
+
+# --- Number of traces ---
+# Each file is run with as many traces (-n) as its #domain, #src_steps/#rx_steps
+# and PML allow, so the antenna is never stepped into the PML. This caps that
+# number for every file (None = no cap). Files without steps run a single trace.
+FIXED_NUMBER_OF_TRACES = 225 # <--- SET YOUR MAXIMUM NUMBER OF TRACES HERE
+
+# --- Scheduler settings ---
+# Maximum number of gprMax runs allowed at the same time (None = as many as the
+# per-job thread budget allows on this machine).
+MAX_WORKERS = None
+# Number of OpenMP threads each gprMax run may use (exported as OMP_NUM_THREADS).
+THREADS_PER_JOB = 4
+# Memory all concurrent runs together may use, from each model's estimated
+# footprint (None = no limit). Jobs that don't fit wait for others to finish.
+MEMORY_BUDGET_GB = None
+# GPUs to run on (device ids). gprMax runs one model per GPU, so the scheduler
+# starts one worker per GPU, each on its own device. None or [] = run on CPU.
+GPU_IDS = [0]
 
 # Define the directory where your generated .in files are located
 input_files_dir = "C:/Users/user/gprMax/batch_sim/simulations_full_strategy_split/split_1"
@@ -13,38 +36,59 @@ input_files_dir = "C:/Users/user/gprMax/batch_sim/simulations_full_strategy_spli
 output_results_dir = "C:/Users/user/gprMax/batch_sim/outputs_simulations_full"
 #os.makedirs(output_results_dir, exist_ok=True)
 
-# Get a list of all .in files in the input directory
-input_files = [f for f in os.listdir(input_files_dir) if f.endswith(".in")]
-input_files.sort()
+# Job ledger used to resume interrupted batches (one JSON record per state change)
+ledger_path = os.path.join(input_files_dir, "batch_ledger.jsonl")
 
-print(f"Found {len(input_files)} .in files to simulate.")
-print(f"Each simulation will run with -n {FIXED_NUMBER_OF_TRACES} traces.")
+# Content-addressed cache of merged results shared by all batches (None to disable)
+cache_dir = "C:/Users/user/gprMax/batch_sim/result_cache"
+CACHE_MAX_GB = 200
 
-# Loop through each input file and run gprMax
-for i, input_filename in enumerate(input_files):
-    input_filepath = os.path.join(input_files_dir, input_filename)
 
-    print(f"\n--- Simulating file {i+1}/{len(input_files)}: {input_filename} ---")
+_trace_counts = {}
+
 
-    # The gprMax command with the fixed -n argument:
-    # python -m gprMax path/to/your/input_file.in -n <FIXED_INTEGER> --output-dir=[output_dir]
+def trace_count(input_filepath):
+    """-n for input_filepath: the traces that fit, capped at FIXED_NUMBER_OF_TRACES."""
+    if input_filepath not in _trace_counts:
+        _trace_counts[input_filepath] = expected_traces(input_filepath, cap=FIXED_NUMBER_OF_TRACES)
+    return _trace_counts[input_filepath]
+
+
+def build_command(input_filepath, n=None, gpu=0):
+    # The gprMax command with the -n argument derived from the model:
+    # python -m gprMax path/to/your/input_file.in -n <traces> --output-dir=[output_dir]
+    if n is None:
+        n = trace_count(input_filepath)
     command = [
         "python",
         "-m",
         "gprMax",
         input_filepath,
         "-n",
-        str(FIXED_NUMBER_OF_TRACES),
-        "-gpu"
-
+        str(n),
     ]
 
-    # Optional: Add GPU flag if you're using it
-    # command.append("-gpu") # Appends "-gpu" if you want to use GPU, defaults to device 0
+    # GPU flag: gpu is the device id (gprMax defaults to device 0), None runs on CPU
+    if gpu is not None:
+        command.append("-gpu")
+        if gpu:
+            command.append(str(gpu))
+    return command
+
+
+def run_simulation(input_filepath, log_file=None, env=None, gpu=0):
+    """Runs gprMax on one .in file (on GPU device gpu, or the CPU if None) and returns its exit code."""
+    input_filename = os.path.basename(input_filepath)
+    command = build_command(input_filepath, gpu=gpu)
 
     try:
-        process = subprocess.run(command, capture_output=False, check=True)
+        if log_file:
+            with open(log_file, "w") as log:
+                subprocess.run(command, stdout=log, stderr=subprocess.STDOUT, check=True, env=env)
+        else:
+            subprocess.run(command, capture_output=False, check=True, env=env)
         print(f"Simulation for {input_filename} completed successfully.")
+        return 0
 
     except subprocess.CalledProcessError as e:
         print(f"ERROR: Simulation for {input_filename} failed.")
@@ -53,11 +97,330 @@ for i, input_filename in enumerate(input_files):
             print(f"Stdout: {e.stdout.decode()}")
         if e.stderr:
             print(f"Stderr: {e.stderr.decode()}")
+        if log_file:
+            print(f"See log: {log_file}")
+        return e.returncode
     except FileNotFoundError:
         print("ERROR: 'python' or 'gprMax' command not found. "
               "Ensure gprMax is installed and your Python environment is correctly set up "
               "(e.g., gprMax conda environment activated).")
     except Exception as e:
         print(f"An unexpected error occurred during simulation of {input_filename}: {e}")
+    return -1
+
+
+def reuse_cached(input_filepath, ledger, cache, ckey, key=None):
+    """Copies a cached merged result into place instead of running gprMax."""
+    n = trace_count(input_filepath)
+    merged = fetch_run(cache, ckey, input_filepath, n)
+    if merged is None:
+        return False
+    ledger.record(input_filepath, "done", key=key, n=n, returncode=0,
+                  wall_time=0.0, outputs=[merged], cached=True)
+    print(f"Reused cached result for {os.path.basename(input_filepath)}: {merged}")
+    return True
+
+
+def run_job(input_filepath, ledger, cache=None, ckey=None, log_file=None, env=None, gpu=0):
+    """Runs one simulation and records its state in the ledger. Returns True on success."""
+    key = file_hash(input_filepath)
+    if cache and reuse_cached(input_filepath, ledger, cache, ckey, key=key):
+        ok = True
+    else:
+        ledger.start(input_filepath, trace_count(input_filepath), key=key)
+        returncode = run_simulation(input_filepath, log_file=log_file, env=env, gpu=gpu)
+        ledger.finish(input_filepath, returncode, key=key)
+        ok = returncode == 0
+        if ok and cache:
+            try:
+                store_run(cache, ckey, input_filepath, trace_count(input_filepath))
+            except OSError as e:
+                # The run itself succeeded; only its duplicates lose the shortcut
+                print(f"Cache: could not store {os.path.basename(input_filepath)}: {e}")
+    return ok
+
+
+def attempt_job(entry, ledger, cache=None, log_file=None, env=None, gpu=0):
+    """run_job plus restore_duplicates for a job entry, never raising.
+
+    An unexpected error fails the job (recorded in the ledger) and leaves its
+    duplicates to be simulated, so one bad file can't stop the batch.
+    Returns (ok, restored filenames, job entry for the rest or None).
+    """
+    input_filename, ckey, duplicates = entry
+    input_filepath = os.path.join(input_files_dir, input_filename)
+    try:
+        ok = run_job(input_filepath, ledger, cache, ckey, log_file=log_file, env=env, gpu=gpu)
+        restored, rest = restore_duplicates(ok, duplicates, ledger, cache, ckey)
+        return ok, restored, rest
+    except Exception as e:
+        print(f"ERROR: {input_filename} failed: {e!r}")
+        try:
+            ledger.finish(input_filepath, -1)
+        except OSError:
+            pass
+        rest = (duplicates[0], ckey, duplicates[1:]) if duplicates else None
+        return False, [], rest
+
+
+def restore_duplicates(ok, duplicates, ledger, cache, ckey):
+    """Fills identical models from the cache once their job has finished.
+
+    Returns (restored filenames, job entry for the rest or None). The rest
+    (all of them if the job failed) still have to be simulated, as an
+    ordinary job of the first one with the others as its duplicates.
+    """
+    restored, remaining = [], []
+    for duplicate in duplicates:
+        duplicate_path = os.path.join(input_files_dir, duplicate)
+        if ok and reuse_cached(duplicate_path, ledger, cache, ckey):
+            restored.append(duplicate)
+        else:
+            remaining.append(duplicate)
+    if not remaining:
+        return restored, None
+    return restored, (remaining[0], ckey, remaining[1:])
+
+
+def plan_jobs(input_files, cache, gpu=0):
+    """Groups byte-for-byte equivalent models so each is only simulated once.
+
+    Returns a list of (input_filename, cache_key, [duplicate filenames]).
+    """
+    if cache is None:
+        return [(f, None, []) for f in input_files]
+    jobs = {}
+    for input_filename in input_files:
+        input_filepath = os.path.join(input_files_dir, input_filename)
+        # Keyed with the default device: which GPU ran a model doesn't change its result
+        ckey = cache_key(input_filepath, build_command(input_filepath, gpu=None if gpu is None else 0)[4:])
+        if ckey in jobs:
+            jobs[ckey][2].append(input_filename)
+        else:
+            jobs[ckey] = (input_filename, ckey, [])
+    return list(jobs.values())
+
+
+def pending_files(input_files, ledger):
+    """Drops files the ledger says already finished with all outputs present."""
+    pending = []
+    for input_filename in input_files:
+        input_filepath = os.path.join(input_files_dir, input_filename)
+        if ledger.is_complete(input_filepath, trace_count(input_filepath)):
+            continue
+        pending.append(input_filename)
+    return pending
+
+
+def estimate_jobs(jobs, calibration=None):
+    """Cost estimate per job (None if the .in file can't be estimated), and the
+    jobs ordered longest first so the big models don't end up last."""
+    estimates = {}
+    for input_filename, _, _ in jobs:
+        try:
+            input_filepath = os.path.join(input_files_dir, input_filename)
+            estimates[input_filename] = estimate(input_filepath, trace_count(input_filepath), calibration)
+        except (OSError, TypeError, ValueError, IndexError, ZeroDivisionError):
+            estimates[input_filename] = None
+    ordered = sorted(jobs, key=lambda job: -(estimates[job[0]] or {}).get("seconds", 0))
+    return ordered, estimates
+
+
+def worker_count(max_workers=MAX_WORKERS, threads_per_job=THREADS_PER_JOB, gpus=None):
+    """Number of concurrent gprMax runs that fit on this machine: one per GPU
+    when running on GPUs, else as many as the per-job thread budget allows."""
+    if gpus:
+        return min(max_workers, len(gpus)) if max_workers else len(gpus)
+    cores = os.cpu_count() or 1
+    fit = max(1, cores // max(1, threads_per_job))
+    if max_workers:
+        return max(1, min(max_workers, fit))
+    return fit
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours:d}:{minutes:02d}:{seconds:02d}"
+
+
+def run_serial(jobs, ledger, cache=None, gpu=0):
+    # Loop through each input file and run gprMax
+    queue = list(jobs)
+    total = sum(1 + len(duplicates) for _, _, duplicates in jobs)
+    finished = 0
+    while queue:
+        entry = queue.pop(0)
+
+        print(f"\n--- Simulating file {finished+1}/{total}: {entry[0]} ---")
+        ok, restored, rest = attempt_job(entry, ledger, cache, gpu=gpu)
+        finished += 1 + len(restored)
+        if rest is not None:
+            queue.insert(0, rest)
+
+
+def run_scheduled(jobs, ledger, workers, threads_per_job=THREADS_PER_JOB, cache=None,
+                  estimates=None, memory_budget=None, gpus=None):
+    """Runs the .in files on a pool of concurrent gprMax processes.
+
+    Each job gets its own OMP_NUM_THREADS budget and writes its console output
+    to a .log file next to the input file so concurrent runs don't interleave.
+    With gpus (device ids), worker i runs all its jobs on gpus[i]; otherwise
+    the runs use the CPU.
+
+    Jobs are started in the given order, except that with a memory_budget (bytes)
+    a job whose estimated memory doesn't fit next to the running ones is passed
+    over for the next one that does. A job always starts if nothing else runs.
+    """
+    total = sum(1 + len(duplicates) for _, _, duplicates in jobs)
+    estimates = estimates or {}
+    queue = list(jobs)
+    state = {"running": 0, "done": 0, "failed": 0, "memory": 0}
+    lock = threading.Condition()
+    start = time.time()
+
+    env = dict(os.environ)
+    env["OMP_NUM_THREADS"] = str(threads_per_job)
+
+    def memory_of(entry):
+        return (estimates.get(entry[0]) or {}).get("memory_bytes", 0)
+
+    def report(input_filename, ok):
+        elapsed = time.time() - start
+        finished = state["done"] + state["failed"]
+        queued = total - finished - state["running"]
+        rate = finished / elapsed if elapsed > 0 else 0.0
+        eta = (total - finished) / rate if rate > 0 else 0.0
+        status = "done" if ok else "FAILED"
+        print(f"[{finished}/{total}] {input_filename} {status} | running {state['running']}, "
+              f"queued {queued}, failed {state['failed']} | "
+              f"{rate * 3600:.1f} runs/h | elapsed {format_duration(elapsed)}, ETA {format_duration(eta)}")
+
+    def next_job():
+        with lock:
+            # A running job may still queue duplicates it couldn't restore
+            while queue or state["running"]:
+                for i, entry in enumerate(queue):
+                    fits = memory_budget is None or state["memory"] + memory_of(entry) <= memory_budget
+                    if fits or state["running"] == 0:
+                        del queue[i]
+                        state["running"] += 1
+                        state["memory"] += memory_of(entry)
+                        return entry
+                lock.wait()
+            return None
+
+    def job(entry, gpu):
+        input_filename = entry[0]
+        log_file = os.path.splitext(os.path.join(input_files_dir, input_filename))[0] + ".log"
+        print(f"--- Starting {input_filename} ---")
+        ok, restored, rest = attempt_job(entry, ledger, cache, log_file=log_file, env=env, gpu=gpu)
+        with lock:
+            state["running"] -= 1
+            state["memory"] -= memory_of(entry)
+            state["done" if ok else "failed"] += 1
+            report(input_filename, ok)
+            for duplicate in restored:
+                state["done"] += 1
+                report(duplicate, True)
+            if rest is not None:
+                # Duplicates that couldn't be restored are queued like any other job
+                estimates.setdefault(rest[0], estimates.get(input_filename))
+                queue.insert(0, rest)
+            lock.notify_all()
+        return ok
+
+    def worker(gpu):
+        entry = next_job()
+        while entry is not None:
+            job(entry, gpu)
+            entry = next_job()
+
+    devices = list(gpus)[:workers] if gpus else [None] * workers
+    workers = len(devices)
+    if gpus:
+        print(f"Scheduling {total} runs on {workers} GPUs ({', '.join(str(g) for g in devices)}).")
+    else:
+        print(f"Scheduling {total} runs on {workers} workers x {threads_per_job} threads.")
+    if memory_budget:
+        print(f"Memory budget: {format_bytes(memory_budget)}")
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for future in [pool.submit(worker, gpu) for gpu in devices]:
+            future.result()
+
+    print(f"\n{state['done']} succeeded, {state['failed']} failed "
+          f"in {format_duration(time.time() - start)}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Runs gprMax on every .in file in a directory.')
+    parser.add_argument('--serial', action='store_true', help='run one simulation at a time')
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS,
+                        help='maximum number of concurrent gprMax runs')
+    parser.add_argument('--threads-per-job', type=int, default=THREADS_PER_JOB,
+                        help='OpenMP threads given to each gprMax run')
+    parser.add_argument('--rerun-all', action='store_true',
+                        help='ignore the job ledger and run every file again')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='always run gprMax, never reuse cached results')
+    parser.add_argument('--cpu', action='store_true',
+                        help='run on the CPU instead of the GPUs in GPU_IDS')
+    parser.add_argument('--memory-budget', type=float, default=MEMORY_BUDGET_GB,
+                        help='GB of memory all concurrent runs may use together')
+    args = parser.parse_args()
+
+    # Get a list of all .in files in the input directory
+    input_files = [f for f in os.listdir(input_files_dir) if f.endswith(".in")]
+    input_files.sort()
+
+    print(f"Found {len(input_files)} .in files to simulate.")
+    # Files whose antenna starts inside the PML would only waste a run
+    runnable = []
+    for input_filename in input_files:
+        try:
+            n = trace_count(os.path.join(input_files_dir, input_filename))
+        except (OSError, TypeError, ValueError, IndexError, ZeroDivisionError) as e:
+            # e.g. no #domain or #dx_dy_dz; one broken file shouldn't stop the batch
+            print(f"Skipping {input_filename}: can't derive the number of traces ({e!r}).")
+            continue
+        if n < 1:
+            print(f"Skipping {input_filename}: the source or receiver starts inside the PML.")
+        else:
+            runnable.append(input_filename)
+    input_files = runnable
+    counts = sorted({trace_count(os.path.join(input_files_dir, f)) for f in input_files})
+    if counts:
+        print(f"Traces per simulation (-n): {counts[0]}" + (f" to {counts[-1]}" if len(counts) > 1 else "")
+              + f" (capped at {FIXED_NUMBER_OF_TRACES}).")
+
+    ledger = JobLedger(ledger_path)
+    if not args.rerun_all:
+        pending = pending_files(input_files, ledger)
+        print(f"Skipping {len(input_files) - len(pending)} files already completed (ledger: {ledger_path}).")
+        input_files = pending
+
+    cache = None
+    if cache_dir and not args.no_cache:
+        cache = ResultCache(cache_dir, int(CACHE_MAX_GB * 1024 ** 3))
+    gpus = None if args.cpu else GPU_IDS
+    jobs = plan_jobs(input_files, cache, gpu=gpus[0] if gpus else None)
+    duplicates = len(input_files) - len(jobs)
+    if duplicates:
+        print(f"{duplicates} files duplicate another model and will reuse its result.")
+
+    # Longest models first, with runtimes calibrated from the runs in the ledger
+    calibration = Calibration.from_ledger(ledger)
+    jobs, estimates = estimate_jobs(jobs, calibration)
+    estimated = sum(e["seconds"] for e in estimates.values() if e)
+    print(f"Estimated compute: {format_duration(estimated)} "
+          f"({len(calibration.samples)} earlier runs used for calibration).")
+
+    if args.serial:
+        run_serial(jobs, ledger, cache, gpu=gpus[0] if gpus else None)
+    else:
+        memory_budget = args.memory_budget * 1024 ** 3 if args.memory_budget else None
+        run_scheduled(jobs, ledger, worker_count(args.workers, args.threads_per_job, gpus),
+                      args.threads_per_job, cache, estimates, memory_budget, gpus)
 
-print("\nAll simulations attempted.")
\ No newline at end of file
+    print("\nAll simulations attempted.")
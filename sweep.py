@@ -0,0 +1,253 @@
+"""Declarative parameter sweeps that yield models lazily.
+
+A Sweep is an iterable of parameter dicts. Axes are combined with product()
+(nested loops, last axis fastest), zipped() (axes stepped together), or
+sampled with random_sample()/latin_hypercube(). Nothing is materialised until
+iterated, so a scheduler can pull the next model on demand, and shard() splits
+any sweep by index across workers or nodes.
+
+time_window() sizes #time_window per model from the deepest target and the
+background permittivity instead of one flat value for the whole sweep;
+TimeWindows applies it to the generators' antenna layout and tallies the
+iterations that saves.
+
+Example (the generate5d.py grid):
+
+    sweep = product(material=materials, radius=radii, depth=depths, angle=angles)
+    for params in sweep.shard(0, 4):
+        ...
+"""
+
+import math
+import heapq
+import random
+import itertools
+
+from in_parser import iterations, max_traces, time_step
+
+# Speed of light in vacuum (m/s)
+C0 = 299792458.0
+
+
+class Sweep:
+    """Re-iterable, lazy sequence of parameter dicts."""
+
+    def __init__(self, factory, length=None):
+        self.factory = factory
+        self.length = length
+
+    def __iter__(self):
+        return iter(self.factory())
+
+    def __len__(self):
+        if self.length is None:
+            raise TypeError("length of this sweep is not known in advance")
+        return self.length
+
+    def shard(self, index, count):
+        """Every count-th model starting at index (models index, index + count, ...)."""
+        if not 0 <= index < count:
+            raise ValueError(f"shard index {index} out of range for {count} shards")
+        length = None
+        if self.length is not None:
+            length = len(range(index, self.length, count))
+        return Sweep(lambda: itertools.islice(self, index, None, count), length)
+
+    def balanced_shard(self, index, count, cost):
+        """The models assigned to shard index when the sweep is split into count
+        shards of about equal total cost(params).
+
+        Uses longest-processing-time-first: models are taken from most to least
+        expensive and each goes to the shard with the least work so far. Costs
+        are computed in one pass over the sweep; only the costs are kept.
+        """
+        if not 0 <= index < count:
+            raise ValueError(f"shard index {index} out of range for {count} shards")
+        assignment = assign_shards([cost(params) for params in self], count)
+        length = assignment.count(index)
+        return Sweep(lambda: (p for p, shard in zip(self, assignment) if shard == index), length)
+
+    def map(self, fn):
+        """Adds derived parameters: fn(params) returns a dict merged into each model."""
+        def factory():
+            for params in self:
+                derived = dict(params)
+                derived.update(fn(params))
+                yield derived
+        return Sweep(factory, self.length)
+
+    def filter(self, predicate):
+        return Sweep(lambda: (p for p in self if predicate(p)))
+
+    def enumerate(self, key="model_id"):
+        """Numbers the models in sweep order."""
+        def factory():
+            for i, params in enumerate(self):
+                numbered = dict(params)
+                numbered[key] = i
+                yield numbered
+        return Sweep(factory, self.length)
+
+
+def assign_shards(costs, count):
+    """Shard number for each cost, balancing the total cost per shard (LPT)."""
+    loads = [(0, shard) for shard in range(count)]
+    assignment = [0] * len(costs)
+    for i in sorted(range(len(costs)), key=lambda i: -costs[i]):
+        load, shard = heapq.heappop(loads)
+        assignment[i] = shard
+        heapq.heappush(loads, (load + costs[i], shard))
+    return assignment
+
+
+def _axis(name, values):
+    """An axis as a Sweep; nested Sweeps are used as they are."""
+    if isinstance(values, Sweep):
+        return values
+    values = list(values)
+    return Sweep(lambda: ({name: v} for v in values), len(values))
+
+
+def _merge(dicts):
+    merged = {}
+    for d in dicts:
+        merged.update(d)
+    return merged
+
+
+def product(*sweeps, **axes):
+    """Cartesian product of the axes, like nested for loops (last axis varies fastest)."""
+    parts = list(sweeps) + [_axis(name, values) for name, values in axes.items()]
+    length = 1
+    for part in parts:
+        length = None if length is None or part.length is None else length * part.length
+    return Sweep(lambda: (_merge(combo) for combo in itertools.product(*parts)), length)
+
+
+def zipped(*sweeps, **axes):
+    """Axes stepped together; stops at the shortest one."""
+    parts = list(sweeps) + [_axis(name, values) for name, values in axes.items()]
+    lengths = [part.length for part in parts]
+    length = None if None in lengths else min(lengths)
+    return Sweep(lambda: (_merge(combo) for combo in zip(*parts)), length)
+
+
+def chain(*sweeps):
+    lengths = [s.length for s in sweeps]
+    length = None if None in lengths else sum(lengths)
+    return Sweep(lambda: itertools.chain(*sweeps), length)
+
+
+def _draw(rng, spec, u=None):
+    """Value for one axis: (low, high) is a continuous range, a list is categorical."""
+    if u is None:
+        u = rng.random()
+    if isinstance(spec, tuple) and len(spec) == 2:
+        low, high = spec
+        return low + u * (high - low)
+    spec = list(spec)
+    return spec[min(int(u * len(spec)), len(spec) - 1)]
+
+
+def random_sample(n, seed=None, **ranges):
+    """n models with every axis drawn independently and uniformly."""
+    def factory():
+        rng = random.Random(seed)
+        for _ in range(n):
+            yield {name: _draw(rng, spec) for name, spec in ranges.items()}
+    return Sweep(factory, n)
+
+
+def latin_hypercube(n, seed=None, **ranges):
+    """n models from a Latin hypercube: each axis is split into n strata and
+    every stratum is used exactly once, which covers the space more evenly than
+    independent random draws."""
+    def factory():
+        rng = random.Random(seed)
+        columns = {}
+        for name in ranges:
+            strata = [(i + rng.random()) / n for i in range(n)]
+            rng.shuffle(strata)
+            columns[name] = strata
+        for i in range(n):
+            yield {name: _draw(rng, spec, columns[name][i]) for name, spec in ranges.items()}
+    return Sweep(factory, n)
+
+
+def frange(start, stop, step, ndigits=3):
+    """Rounded float range, inclusive of stop when it lands on a step."""
+    count = int(math.floor((stop - start) / step + 1e-9)) + 1
+    return [round(start + i * step, ndigits) for i in range(count)]
+
+
+def two_way_time(depth, eps_r, offset=0.0):
+    """Travel time down to depth and back through a medium of relative permittivity
+    eps_r, for a source and receiver offset apart."""
+    path = 2 * math.sqrt(depth ** 2 + (offset / 2) ** 2)
+    return path * math.sqrt(eps_r) / C0
+
+
+def time_window(depth, eps_r, frequency, offset=0.0, margin=0.1):
+    """Time window that records the reflection from depth in full.
+
+    Adds the length of a Ricker pulse of the given centre frequency (gprMax
+    delays it by sqrt(2)/f, so it has died out after 2*sqrt(2)/f) to the
+    two-way time, then the relative margin on top.
+    """
+    pulse = 2 * math.sqrt(2) / frequency
+    return (two_way_time(depth, eps_r, offset) + pulse) * (1 + margin)
+
+
+def format_time_window(seconds):
+    """Seconds as an .in file value in nanoseconds, e.g. 4.37e-08 -> '43.7e-9'."""
+    return f"{math.ceil(seconds * 1e10) / 10:g}e-9"
+
+
+def window_iterations(seconds, dt):
+    """Iterations gprMax runs for a time window (same rounding as gprMax)."""
+    return int(math.ceil(seconds / dt)) + 1
+
+
+class TimeWindows:
+    """#time_window for the models of a sweep, plus a tally of what it saves.
+
+    Windows are sized with time_window() from the depth of each model's deepest
+    target below the antenna line, or set to fixed for every model when auto
+    is off. The defaults match the generators' templates: a half_space of
+    eps_r 6, a 500 MHz Ricker and source/receiver 0.2 m apart at y = 0.170.
+    """
+
+    def __init__(self, fixed, auto=True, eps_r=6, frequency=500e6, antenna_y=0.170,
+                 offset=0.2, margin=0.1):
+        self.fixed = fixed
+        self.auto = auto
+        self.eps_r = eps_r
+        self.frequency = frequency
+        self.antenna_y = antenna_y
+        self.offset = offset
+        self.margin = margin
+        self.models = 0
+        self.iterations_saved = 0
+
+    def __call__(self, target_y):
+        """{'time_window': ...} for a model whose deepest target point is at target_y."""
+        if not self.auto:
+            return {"time_window": format_time_window(self.fixed)}
+        window = time_window(target_y - self.antenna_y, self.eps_r, self.frequency,
+                             self.offset, self.margin)
+        return {"time_window": format_time_window(window)}
+
+    def tally(self, commands, cap=None):
+        """Adds the iterations a model saves against the fixed window, over all
+        of its traces (as many as fit in the domain, at most cap)."""
+        traces = max_traces(commands) or 1
+        if cap is not None:
+            traces = min(traces, cap)
+        saved = window_iterations(self.fixed, time_step(commands)) - iterations(commands)
+        self.models += 1
+        self.iterations_saved += saved * traces
+
+    def report(self):
+        return (f"Time windows sized per model: {self.iterations_saved:,} iterations saved over "
+                f"the sweep, all traces included ({self.iterations_saved / max(self.models, 1):,.0f} "
+                f"per model) against a flat {format_time_window(self.fixed)} s")
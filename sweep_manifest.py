@@ -0,0 +1,247 @@
+"""SQLite manifest of a generated sweep.
+
+The generators record one row per model: its ID, sweep parameters, input file,
+expected trace count, output base (gprMax appends the trace number and .out)
+and merged output file. Collectors, plotters and dataset builders look models
+up here instead of listing directories and parsing parameters out of names.
+
+Paths are stored relative to the manifest, so a sweep folder can be moved to
+another machine together with its manifest.
+"""
+
+import os
+import json
+import sqlite3
+import argparse
+
+from in_parser import read_commands, output_dir, max_traces
+
+MANIFEST_NAME = "manifest.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS models (
+    model_id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    params TEXT NOT NULL,
+    input_path TEXT NOT NULL,
+    expected_traces INTEGER,
+    output_base TEXT NOT NULL,
+    merged_path TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS processed (
+    name TEXT PRIMARY KEY
+)
+"""
+
+
+class SweepManifest:
+    """Model ID -> parameters, input file, expected traces and output paths."""
+
+    def __init__(self, path):
+        self.path = path
+        self.root = os.path.dirname(os.path.abspath(path))
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+        self._by_file = None
+
+    def relative(self, path):
+        return os.path.relpath(os.path.abspath(path), self.root)
+
+    def absolute(self, path):
+        return os.path.normpath(os.path.join(self.root, path))
+
+    def add(self, input_path, params, traces=None):
+        """Records the model written to input_path. Returns its model ID.
+
+        The expected trace count and output paths are read from the .in file,
+        so call this after the file has been written.
+        """
+        commands = read_commands(input_path)
+        name = os.path.splitext(os.path.basename(input_path))[0]
+        output_base = os.path.join(output_dir(input_path, commands), name)
+        if traces is None:
+            traces = max_traces(commands)
+        cursor = self.db.execute(
+            "INSERT OR REPLACE INTO models (name, params, input_path, expected_traces, output_base, merged_path) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (name, json.dumps(params), self.relative(input_path), traces,
+             self.relative(output_base), self.relative(output_base + "_merged.out")))
+        self._by_file = None
+        return cursor.lastrowid
+
+    def commit(self):
+        self.db.commit()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM models").fetchone()[0]
+
+    def row(self, record):
+        model_id, name, params, input_path, traces, output_base, merged = record
+        return {"model_id": model_id, "name": name, "params": json.loads(params),
+                "input_path": self.absolute(input_path), "expected_traces": traces,
+                "output_base": self.absolute(output_base), "merged_path": self.absolute(merged)}
+
+    def models(self, **criteria):
+        """Models in ID order whose parameters equal the given values, e.g. models(material='clay')."""
+        rows = []
+        for record in self.db.execute("SELECT * FROM models ORDER BY model_id"):
+            row = self.row(record)
+            if all(row["params"].get(key) == value for key, value in criteria.items()):
+                rows.append(row)
+        return rows
+
+    def get(self, name):
+        """Model by name (the .in file stem), or None."""
+        record = self.db.execute("SELECT * FROM models WHERE name = ?", (name,)).fetchone()
+        return self.row(record) if record else None
+
+    def find(self, filename):
+        """Model an input, trace or merged output file belongs to, or None."""
+        if self._by_file is None:
+            self._by_file = {}
+            for row in self.models():
+                for path in (row["input_path"], row["merged_path"]):
+                    self._by_file[os.path.basename(path)] = row
+        row = self._by_file.get(os.path.basename(filename))
+        if row is None:
+            # Trace file: <output base><trace number>.out
+            stem = os.path.splitext(os.path.basename(filename))[0]
+            row = self.get(stem.rstrip("0123456789"))
+        return row
+
+    def params(self, filename):
+        """Sweep parameters of the model a file belongs to, or None."""
+        row = self.find(filename)
+        return row["params"] if row else None
+
+    def processed(self):
+        """Names of the models a collector has merged, plotted and stored."""
+        return {name for (name,) in self.db.execute("SELECT name FROM processed")}
+
+    def mark_processed(self, name):
+        self.db.execute("INSERT OR IGNORE INTO processed (name) VALUES (?)", (name,))
+        self.db.commit()
+
+    def merged_files(self, **criteria):
+        """Merged outputs that exist, optionally filtered by parameters."""
+        return [row["merged_path"] for row in self.models(**criteria) if os.path.exists(row["merged_path"])]
+
+
+def parse_criteria(items):
+    """{'material': 'clay', 'depth': 0.5} from command line items like material=clay depth=0.5."""
+    criteria = {}
+    for item in items:
+        key, value = item.split("=", 1)
+        try:
+            criteria[key] = json.loads(value)
+        except ValueError:
+            criteria[key] = value
+    return criteria
+
+
+def group_name(name):
+    """Collector group name of a model: its name without the trailing underscore."""
+    return name[:-1] if name.endswith("_") else name
+
+
+class ManifestIndex:
+    """Drop-in for TraceIndex that checks the trace files a manifest expects.
+
+    Instead of listing a folder of 300k+ files, scan() stats the output paths
+    the manifest records for the models that aren't merged yet, wherever the
+    collector runs from; trace_path() and merged_path() give the collectors
+    the same locations. Groups are keyed like the collectors' GROUP_PATTERN
+    (model name without the trailing underscore). Expected counts are capped
+    at cap, the -n the batch was run with; models without steps count one
+    trace. If the job ledger recorded the -n a model actually ran with, that
+    is used instead.
+
+    Processed groups are recorded in the manifest. A merged file of a group
+    that isn't processed yet (e.g. restored from the result cache) is listed
+    by unprocessed() instead of being merged again.
+    """
+
+    def __init__(self, manifest, cap=None, ledger=None):
+        self.manifest = manifest
+        self.models = {}  # group name -> manifest row
+        self.counts = {}  # group name -> expected traces
+        self.complete = {group_name(name) for name in manifest.processed()}
+        for row in manifest.models():
+            # No #src_steps/#rx_steps: run once, one trace (as in_parser.expected_traces)
+            count = row["expected_traces"] if row["expected_traces"] is not None else 1
+            if cap is not None and count > cap:
+                count = cap
+            if ledger is not None and ledger.traces_for(row["input_path"]) is not None:
+                count = ledger.traces_for(row["input_path"])
+            if not count:
+                continue
+            base_name = group_name(row["name"])
+            self.models[base_name] = row
+            self.counts[base_name] = count
+
+    def expected(self, base_name):
+        return self.counts[base_name]
+
+    def trace_path(self, base_name, filename):
+        """Full path of a trace file of the group, in the output folder the manifest records."""
+        return os.path.join(os.path.dirname(self.models[base_name]["output_base"]), filename)
+
+    def merged_path(self, base_name):
+        return self.models[base_name]["merged_path"]
+
+    def scan(self):
+        """{base_name: {filename: (size, mtime)}} of the trace files present so far."""
+        groups = {}
+        for base_name, row in self.models.items():
+            if base_name in self.complete or os.path.exists(row["merged_path"]):
+                continue
+            files = {}
+            for i in range(1, self.counts[base_name] + 1):
+                path = f"{row['output_base']}{i}.out"
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files[os.path.basename(path)] = (st.st_size, st.st_mtime)
+            if files:
+                groups[base_name] = files
+        return groups
+
+    def unprocessed(self):
+        """{base_name: merged path} of merged files no collector has processed yet."""
+        return {base_name: row["merged_path"] for base_name, row in self.models.items()
+                if base_name not in self.complete and os.path.exists(row["merged_path"])}
+
+    def mark_complete(self, base_name):
+        self.complete.add(base_name)
+        self.manifest.mark_processed(self.models[base_name]["name"])
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Lists the models of a sweep manifest.',
+                                     usage='python sweep_manifest.py manifest.sqlite --where material=clay')
+    parser.add_argument('manifest', help='manifest file written by a generator')
+    parser.add_argument('--where', nargs='*', default=[], help='parameter filters as name=value')
+    parser.add_argument('--merged', action='store_true', help='only list existing merged outputs')
+    args = parser.parse_args()
+
+    criteria = parse_criteria(args.where)
+
+    with SweepManifest(args.manifest) as manifest:
+        if args.merged:
+            for path in manifest.merged_files(**criteria):
+                print(path)
+        else:
+            for row in manifest.models(**criteria):
+                print(row["model_id"], row["name"], row["expected_traces"], json.dumps(row["params"]))
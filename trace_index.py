@@ -0,0 +1,159 @@
+import os
+import re
+import json
+
+from in_parser import expected_traces
+
+# Merged file of a group as the collectors name it (like tools.outputfiles_merge)
+MERGED_SUFFIX = "__merged.out"
+
+
+class TraceIndex:
+    """Persistent index of per-trace .out files grouped by base name.
+
+    The index is saved next to the outputs as JSON with the size and mtime of
+    every trace file. On the next scan only names that aren't in the index yet
+    go through the regex, and files are only re-stat'ed while their group is
+    still incomplete, so repeat runs over 300k+ files stay cheap.
+
+    complete holds the groups a collector has processed (merged, plotted,
+    stored). A <base>__merged.out that isn't in complete, e.g. one restored
+    from the result cache, is listed by unprocessed() instead of being merged
+    again.
+    """
+
+    def __init__(self, directory, pattern, index_file=".trace_index.json"):
+        self.directory = directory
+        self.regex = re.compile(pattern)
+        self.path = os.path.join(directory, index_file)
+        self.files = {}     # filename -> [size, mtime]
+        self.groups = {}    # base name -> sorted list of filenames
+        self.complete = set()
+        self.merged = {}    # base name -> merged filename present in the folder
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except ValueError:
+            # Interrupted save, rebuild from scratch
+            return
+        if data.get("pattern") != self.regex.pattern:
+            return
+        self.files = data["files"]
+        self.groups = data["groups"]
+        self.complete = set(data.get("complete", []))
+
+    def save(self):
+        data = {"pattern": self.regex.pattern, "files": self.files,
+                "groups": self.groups, "complete": sorted(self.complete)}
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+    def scan(self):
+        """Updates the index and returns {base_name: {filename: (size, mtime)}}.
+
+        Groups that are complete, or whose <base>__merged.out already exists,
+        are left out, so a restarted collector doesn't merge them again.
+        """
+        changed = False
+        present = set()
+        merged = {}
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                name = entry.name
+                if not name.endswith(".out"):
+                    continue
+                present.add(name)
+                if name.endswith(MERGED_SUFFIX):
+                    base = name[:-len(MERGED_SUFFIX)]
+                    # Same groups as the trace files: base must fit the pattern
+                    if self.regex.match(f"{base}_1.out"):
+                        merged[base] = name
+                    continue
+                known = name in self.files
+                if known and self.base_of(name) in self.complete:
+                    continue
+                if not known:
+                    match = self.regex.match(name)
+                    if not match:
+                        continue
+                    self.groups.setdefault(match.group(1), []).append(name)
+                st = entry.stat()
+                stamp = [st.st_size, st.st_mtime]
+                if self.files.get(name) != stamp:
+                    self.files[name] = stamp
+                    changed = True
+
+        # Forget files that were removed (e.g. merged with --remove-files); a
+        # group only needs processing again if its merged file went too
+        for name in [n for n in self.files if n not in present]:
+            del self.files[name]
+            base = self.base_of(name)
+            self.groups[base].remove(name)
+            if not self.groups[base]:
+                del self.groups[base]
+            if base not in merged:
+                self.complete.discard(base)
+            changed = True
+
+        self.merged = merged
+
+        if changed:
+            for names in self.groups.values():
+                names.sort()
+            self.save()
+        return {base: {name: tuple(self.files[name]) for name in names}
+                for base, names in self.groups.items() if base not in self.complete and base not in merged}
+
+    def unprocessed(self):
+        """{base_name: merged path} of merged files no collector has processed yet
+        (as of the last scan)."""
+        return {base: os.path.join(self.directory, name)
+                for base, name in self.merged.items() if base not in self.complete}
+
+    def trace_path(self, base_name, filename):
+        return os.path.join(self.directory, filename)
+
+    def merged_path(self, base_name):
+        return os.path.join(self.directory, base_name + MERGED_SUFFIX)
+
+    def base_of(self, name):
+        return self.regex.match(name).group(1)
+
+    def mark_complete(self, base_name):
+        """Freezes a finished group so its files are no longer re-stat'ed."""
+        self.complete.add(base_name)
+        self.save()
+
+
+class ExpectedCounts:
+    """Expected number of traces per group.
+
+    If the job ledger recorded a run of the group's .in file, its -n is used.
+    Otherwise the count is how many #src_steps/#rx_steps fit in the domain
+    outside the PML, capped at max_traces, or one trace for a model without
+    steps (the same rule simulate_Bscan.py applies). Groups whose .in file can't be found fall back to max_traces.
+    """
+
+    def __init__(self, input_dir, max_traces, ledger=None):
+        self.input_dir = input_dir
+        self.max_traces = max_traces
+        self.ledger = ledger
+        self.counts = {}
+
+    def __call__(self, base_name):
+        if base_name not in self.counts:
+            self.counts[base_name] = self.max_traces
+            for name in (f"{base_name}_.in", f"{base_name}.in"):
+                path = os.path.join(self.input_dir, name)
+                if os.path.exists(path):
+                    n = self.ledger.traces_for(path) if self.ledger is not None else None
+                    self.counts[base_name] = n if n is not None else expected_traces(path, cap=self.max_traces)
+                    break
+        return self.counts[base_name]